@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Batch Watermark Corpus Builder
+Applies the demo watermark styles to every image in a directory tree (or a
+file list) and streams paired clean/watermarked outputs to an output tree,
+for building large before/after corpora for the remover
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, List, Tuple
+
+from PIL import Image, ImageOps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ultra_watermark_regen as ultra  # noqa: E402
+from encoders import CORPUS_ENCODERS  # noqa: E402
+from generate_demo_images import DEMO_VARIANTS, DemoImageGenerator  # noqa: E402
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff'}
+# --format name -> encoder; settings live in encoders.CORPUS_ENCODERS
+FORMATS = {
+    'jpg': CORPUS_ENCODERS['jpeg'],
+    'webp': CORPUS_ENCODERS['webp'],
+    'png': CORPUS_ENCODERS['png'],
+}
+# With --format same, sources in any other format are written as .png
+EXTENSION_FORMATS = {'.jpg': 'jpg', '.jpeg': 'jpg', '.webp': 'webp', '.png': 'png'}
+CLEAN_DIR = 'clean'
+# File-list entries outside the list's directory are written under this subdirectory
+EXTERNAL_DIR = '_external'
+
+
+def build_styles(text: str) -> dict:
+    """Style name -> function of an RGB image, covering both generators"""
+    demo = DemoImageGenerator(create_dirs=False)
+    styles = {f"{name}_full": fn for name, fn in ultra.STYLE_FN.items() if name != 'text'}
+    styles['text_full'] = lambda img: ultra.wm_text_full(img, text)
+    for name, method_name, args in DEMO_VARIANTS:
+        styles[name] = (lambda img, m=getattr(demo, method_name), a=args: m(img, *a))
+    return styles
+
+
+def iter_inputs(input_dir: str = None, file_list: str = None) -> Iterator[Tuple[str, str]]:
+    """Yield (path, path relative to the input root) lazily, without listing everything first"""
+    if file_list:
+        # Relative entries resolve against the list's own directory
+        root = os.path.dirname(os.path.abspath(file_list))
+        with open(file_list) as f:
+            for line in f:
+                path = line.strip()
+                if not path or path.startswith('#'):
+                    continue
+                path = os.path.normpath(os.path.join(root, path))
+                yield path, list_relpath(path, root)
+        return
+    for dirpath, dirnames, filenames in os.walk(input_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                path = os.path.join(dirpath, name)
+                yield path, os.path.relpath(path, input_dir)
+
+
+def list_relpath(path: str, root: str) -> str:
+    """Output-relative path for a list entry; entries outside `root` get a stable unique name"""
+    rel = os.path.relpath(path, root)
+    if rel != os.pardir and not rel.startswith(os.pardir + os.sep):
+        return rel
+    stem, ext = os.path.splitext(os.path.basename(path))
+    tag = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:10]
+    return os.path.join(EXTERNAL_DIR, f"{stem}-{tag}{ext}")
+
+
+def resolve_format(path: str, fmt: str) -> str:
+    """FORMATS key to write `path` with; 'same' follows the extension, falling back to PNG"""
+    if fmt == 'same':
+        return EXTENSION_FORMATS.get(os.path.splitext(path)[1].lower(), 'png')
+    return fmt
+
+
+def output_path(output_dir: str, subdir: str, rel: str, fmt: str) -> str:
+    rel = os.path.normpath(rel)
+    if os.path.isabs(rel) or rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        raise ValueError(f"input path {rel!r} would be written outside {os.path.join(output_dir, subdir)}")
+    stem, ext = os.path.splitext(rel)
+    if fmt != 'same' or ext.lower() not in EXTENSION_FORMATS:
+        ext = FORMATS[resolve_format(rel, fmt)].ext
+    return os.path.join(output_dir, subdir, stem + ext)
+
+
+def save(img: Image.Image, path: str, fmt: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    encoder = FORMATS[resolve_format(path, fmt)]
+    # Write under a temporary name so an interrupted run never leaves a truncated file
+    tmp = path + '.part'
+    img.save(tmp, encoder.pil_format, **encoder.save_params())
+    os.replace(tmp, path)
+
+
+_STYLES = None
+
+
+def _init_worker(text: str):
+    global _STYLES
+    _STYLES = build_styles(text)
+
+
+def process_image(path: str, rel: str, styles: List[str], output_dir: str,
+                  fmt: str, skip_existing: bool) -> Tuple[str, int, str]:
+    """Write the clean copy and every requested style for one image; returns (rel, written, error)"""
+    targets = [(CLEAN_DIR, None)] + [(style, style) for style in styles]
+    try:
+        pending = [(output_path(output_dir, subdir, rel, fmt), style) for subdir, style in targets]
+    except ValueError as e:
+        return rel, 0, str(e)
+    if skip_existing:
+        pending = [(out, style) for out, style in pending if not os.path.exists(out)]
+    if not pending:
+        return rel, 0, ''
+    try:
+        with Image.open(path) as src:
+            ImageOps.exif_transpose(src, in_place=True)
+            # No defensive copies: large sources would otherwise sit in memory two or three times
+            img = src if src.mode == 'RGB' else src.convert('RGB')
+            img.load()
+        for out, style in pending:
+            save(img if style is None else _STYLES[style](img), out, fmt)
+    except Exception as e:
+        return rel, 0, str(e)
+    return rel, len(pending), ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply watermark styles to a directory of images')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--input', help='directory to walk for images')
+    source.add_argument('--file-list', help='file with one image path per line')
+    parser.add_argument('--output', help='output root; one subdirectory per style plus clean/')
+    parser.add_argument('--styles', default='all',
+                        help='comma-separated styles, or "all" (see --list-styles)')
+    parser.add_argument('--list-styles', action='store_true', help='print the available styles and exit')
+    parser.add_argument('--text', default='SAMPLE', help='text for the text_full style')
+    parser.add_argument('--format', choices=['same'] + sorted(FORMATS), default='same',
+                        help='output format (default: keep the source format; TIFF and BMP are written as .png)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--skip-existing', action='store_true',
+                        help='skip outputs that already exist, to resume an interrupted run')
+    args = parser.parse_args(argv)
+
+    available = sorted(build_styles(args.text))
+    if args.list_styles:
+        print('\n'.join(available))
+        return
+    if not (args.input or args.file_list) or not args.output:
+        parser.error('--output and one of --input/--file-list are required')
+    styles = available if args.styles == 'all' else [s.strip() for s in args.styles.split(',') if s.strip()]
+    unknown = sorted(set(styles) - set(available))
+    if unknown:
+        parser.error(f"unknown styles: {', '.join(unknown)}")
+
+    print(f"Applying {len(styles)} styles with {args.workers} workers → {args.output}")
+    started = time.monotonic()
+    done = written = 0
+    failures = []
+    # Keep only a bounded number of images in flight so memory stays flat on huge trees
+    max_in_flight = max(1, args.workers) * 2
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker,
+                             initargs=(args.text,)) as pool:
+        in_flight = set()
+        for path, rel in iter_inputs(args.input, args.file_list):
+            if len(in_flight) >= max_in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    done, written = _collect(fut, done, written, failures)
+            in_flight.add(pool.submit(process_image, path, rel, styles, args.output,
+                                      args.format, args.skip_existing))
+        for fut in in_flight:
+            done, written = _collect(fut, done, written, failures)
+
+    elapsed = time.monotonic() - started
+    print(f"\n✓ {done} images, {written} files written in {elapsed:.1f}s")
+    if failures:
+        print(f"✖ {len(failures)} images failed:")
+        for rel, error in failures:
+            print(f"  {rel}: {error}")
+        sys.exit(1)
+
+
+def _collect(fut, done: int, written: int, failures: list) -> Tuple[int, int]:
+    rel, count, error = fut.result()
+    if error:
+        failures.append((rel, error))
+    done += 1
+    if done % 100 == 0:
+        print(f"  … {done} images processed")
+    return done, written + count
+
+
+if __name__ == '__main__':
+    main()
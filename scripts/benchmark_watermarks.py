@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Watermark Benchmark Suite
+Times every watermark style and base generator at several resolutions and
+records wall time, peak RSS and Python/NumPy allocations to a JSON results
+file; --compare flags regressions against a stored baseline
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import PIL
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ultra_watermark_regen as ultra  # noqa: E402
+from generate_demo_images import DEMO_VARIANTS, DemoImageGenerator  # noqa: E402
+from generate_new_watermark_demo import NewWatermarkGenerator  # noqa: E402
+
+SIZES = [(800, 600), (1200, 675), (1920, 1080), (3840, 2160)]
+PHOTO_TYPES = ['portrait', 'product', 'landscape', 'architecture', 'lifestyle']
+DEFAULT_OUTPUT = '.cache/benchmarks/latest.json'
+DEFAULT_THRESHOLD = 0.10
+# Linux reports ru_maxrss in KiB, macOS in bytes
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def build_cases() -> Dict[str, Callable[[Tuple[int, int]], Callable[[], object]]]:
+    """Case name -> setup(size) returning the zero-argument callable to time"""
+    demo = DemoImageGenerator(create_dirs=False)
+    generator = NewWatermarkGenerator(create_dirs=False)
+    cases = {}
+
+    def on_image(fn):
+        def setup(size):
+            rng = np.random.default_rng(0)
+            img = Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+            return lambda: fn(img)
+        return setup
+
+    cases['ultra.wm_text_full'] = on_image(lambda img: ultra.wm_text_full(img, 'SAMPLE'))
+    for name in ('logo', 'pattern', 'embedded'):
+        cases[f'ultra.wm_{name}_full'] = on_image(ultra.STYLE_FN[name])
+    for name, method_name, args in DEMO_VARIANTS:
+        method = getattr(demo, method_name)
+        cases[f'demo.{method_name}[{name}]'] = on_image(lambda img, m=method, a=args: m(img, *a))
+
+    def base_case(photo_type):
+        def setup(size):
+            return lambda: generator.create_realistic_photo_base(photo_type, size)
+        return setup
+
+    for photo_type in PHOTO_TYPES:
+        cases[f'base.create_realistic_photo_base[{photo_type}]'] = base_case(photo_type)
+    return cases
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+
+def run_case(name: str, size: Tuple[int, int], repeat: int) -> dict:
+    """Measure one case; runs in a fresh child so peak RSS belongs to this case alone"""
+    fn = build_cases()[name](size)
+    rss_before = current_rss()
+    fn()  # warm-up: fonts, sprites and lazy imports
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+    # Allocation tracing slows everything down, so it gets its own untimed run
+    tracemalloc.start()
+    fn()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    retained_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+
+    return {
+        'name': name,
+        'size': f"{size[0]}x{size[1]}",
+        'repeat': repeat,
+        'wall_min_s': min(times),
+        'wall_median_s': statistics.median(times),
+        'peak_rss_mb': peak_rss / 2**20,
+        'rss_growth_mb': max(0, peak_rss - rss_before) / 2**20,
+        'alloc_peak_mb': alloc_peak / 2**20,
+        'alloc_retained_blocks': retained_blocks,
+    }
+
+
+def run_suite(names: List[str], sizes: List[Tuple[int, int]], repeat: int) -> List[dict]:
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    for name in names:
+        for size in sizes:
+            with ctx.Pool(1) as pool:
+                result = pool.apply(run_case, (name, size, repeat))
+            print(f"{name:55s} {result['size']:>10s} {result['wall_min_s'] * 1000:9.1f} ms "
+                  f"{result['peak_rss_mb']:8.1f} MB RSS {result['alloc_peak_mb']:8.1f} MB alloc")
+            results.append(result)
+    return results
+
+
+def compare(results: List[dict], baseline_path: str, threshold: float) -> List[str]:
+    """Regressions beyond `threshold` (a fraction) in time, RSS or allocations"""
+    with open(baseline_path) as f:
+        baseline = {(r['name'], r['size']): r for r in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        base = baseline.get((result['name'], result['size']))
+        if base is None:
+            continue
+        for metric in ('wall_min_s', 'peak_rss_mb', 'alloc_peak_mb'):
+            old, new = base[metric], result[metric]
+            if old > 0 and (new - old) / old > threshold:
+                regressions.append(f"{result['name']} @ {result['size']}: {metric} "
+                                   f"{old:.4g} → {new:.4g} ({(new - old) / old:+.0%})")
+    return regressions
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    width, height = (int(part) for part in value.lower().split('x'))
+    return width, height
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the watermark styles and base generators')
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this text')
+    parser.add_argument('--sizes', type=lambda v: [parse_size(s) for s in v.split(',')], default=SIZES,
+                        help='comma-separated WIDTHxHEIGHT list (default: 800x600 … 3840x2160)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case (default: 3)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help=f'results file (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--compare', metavar='BASELINE', help='flag regressions against a results file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative increase that counts as a regression (default: 0.10)')
+    parser.add_argument('--list', action='store_true', help='list the cases and exit')
+    args = parser.parse_args(argv)
+
+    names = [name for name in build_cases() if args.filter in name]
+    if args.list:
+        print('\n'.join(names))
+        return
+
+    results = run_suite(names, args.sizes, args.repeat)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({
+            'meta': {
+                'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'pillow': PIL.__version__,
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"\n✓ Saved results to: {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n✖ {len(regressions)} regressions over {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"✓ No regressions over {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
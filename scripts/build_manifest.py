@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Incremental build manifest for demo assets
+Records a digest of every input that went into each output file (source
+bytes, style config, font file, encoder parameters, script version) so reruns
+only rebuild outputs whose inputs changed
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+DEFAULT_MANIFEST = os.getenv('DEMO_BUILD_MANIFEST', '.cache/demo-build-manifest.json')
+
+
+def digest(*parts) -> str:
+    """Hash a mix of bytes and JSON-serialisable values into one hex digest"""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            h.update(b'b')
+            h.update(bytes(part))
+        else:
+            h.update(b'j')
+            h.update(json.dumps(part, sort_keys=True, default=repr).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def file_digest(path: Optional[str]) -> Optional[str]:
+    """Digest of a file's contents, or None when there is no such file"""
+    if not path:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class BuildManifest:
+    def __init__(self, path: str = DEFAULT_MANIFEST, force: bool = False):
+        self.path = path
+        self.force = force
+        self._lock = threading.Lock()
+        self._removed = set()
+        self.entries = self._read()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f).get('outputs', {})
+        except (OSError, ValueError):
+            return {}
+
+    def is_fresh(self, output: str, inputs: str) -> bool:
+        """True when `output` exists and was last built from the same inputs"""
+        if self.force or not os.path.exists(output):
+            return False
+        return self.entries.get(output, {}).get('inputs') == inputs
+
+    def group_fresh(self, group: str, inputs: str) -> bool:
+        """True when every output previously recorded under `group` is fresh"""
+        outputs = [o for o, e in self.entries.items() if e.get('group') == group]
+        return bool(outputs) and all(self.is_fresh(o, inputs) for o in outputs)
+
+    def record(self, output: str, inputs: str, group: Optional[str] = None, info: Optional[dict] = None):
+        """Remember what `output` was built from, plus optional details such as its encoding"""
+        entry = {'inputs': inputs}
+        if group:
+            entry['group'] = group
+        if info:
+            entry['info'] = info
+        with self._lock:
+            self.entries[output] = entry
+            self._removed.discard(output)
+
+    def clear_group(self, group: str):
+        """Forget a group's outputs before rebuilding it, so dropped outputs don't linger"""
+        with self._lock:
+            for output in [o for o, e in self.entries.items() if e.get('group') == group]:
+                del self.entries[output]
+                self._removed.add(output)
+
+    def save(self):
+        """Merge with the manifest on disk so scripts sharing it don't clobber each other"""
+        with self._lock:
+            merged = self._read()
+            for output in self._removed:
+                merged.pop(output, None)
+            merged.update(self.entries)
+            self.entries = merged
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'outputs': merged}, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Bounding-box alpha compositing for watermark overlays
+Blends RGBA layers into an RGB image one layer bounding box at a time,
+instead of convert('RGBA') → Image.alpha_composite → convert('RGB') over the
+full frame per layer; layers covering most of the frame still take that plain
+full-frame blend. Marks repeated across a grid can be rasterized once as a
+stamp and pasted per cell. Solid tints become a per-channel lookup table. Frames
+past large_image.LARGE_IMAGE_PIXELS are rendered and blended a strip of rows
+at a time, so no full-frame RGBA buffer is built. Pixels match the
+full-frame chain exactly
+"""
+
+import functools
+from typing import Callable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import large_image
+
+# Transparent margin kept around recorded marks, so antialiasing never reaches the canvas edge
+OVERLAY_PAD = 2
+# Text options that change where glyphs land (fill colors don't)
+TEXT_LAYOUT_OPTIONS = ('font', 'anchor', 'spacing', 'align', 'direction', 'features', 'language',
+                       'stroke_width', 'embedded_color', 'font_size')
+
+# Layers covering at least this share of the frame blend over the whole frame: cropping
+# to their bounding box would save too little to pay for the crop, copy and paste
+FULL_FRAME_SHARE = 0.75
+# Bucket size of the index Overlay.stamp() uses to find earlier marks near a cell
+STAMP_INDEX_CELL = 256
+
+_MEASURE = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+
+
+def _shift(xy, dx: int, dy: int):
+    """Translate ImageDraw coordinates: a point, a flat [x0, y0, x1, y1…] list or a list of points"""
+    if xy and isinstance(xy[0], (tuple, list)):
+        return [(x + dx, y + dy) for x, y in xy]
+    return [v + (dx if i % 2 == 0 else dy) for i, v in enumerate(xy)]
+
+
+def _overlaps(a, b, pad: int = 0) -> bool:
+    return a[0] - pad < b[2] and b[0] < a[2] + pad and a[1] - pad < b[3] and b[1] < a[3] + pad
+
+
+@functools.lru_cache(maxsize=1024)
+def _text_origin_box(text, layout: tuple):
+    return _MEASURE.textbbox((0, 0), text, **dict(layout))
+
+
+def _text_box(xy, text, kwargs: dict):
+    """textbbox at `xy`, laid out once per (text, font, options) and offset; layouts never depend on xy"""
+    layout = tuple((k, kwargs[k]) for k in TEXT_LAYOUT_OPTIONS if k in kwargs)
+    try:
+        box = _text_origin_box(text, layout)
+    except TypeError:
+        # Unhashable options (a features list): measure directly
+        return _MEASURE.textbbox(xy, text, **dict(layout))
+    return box[0] + xy[0], box[1] + xy[1], box[2] + xy[0], box[3] + xy[1]
+
+
+def _points_box(xy, grow: int = 0) -> Tuple[int, int, int, int]:
+    flat = [v for point in xy for v in point] if xy and isinstance(xy[0], (tuple, list)) else list(xy)
+    xs, ys = flat[0::2], flat[1::2]
+    return (int(min(xs)) - grow, int(min(ys)) - grow, int(max(xs)) + 1 + grow, int(max(ys)) + 1 + grow)
+
+
+class Stamp(NamedTuple):
+    """Marks rasterized once by Overlay.make_stamp(), to paste wherever they repeat"""
+    image: Image.Image
+    # 255 where pasting `image` leaves what drawing the marks would, whatever was below
+    mask: Image.Image
+    # Top-left of `image` relative to the point the marks are drawn around
+    offset: Tuple[int, int]
+    # Box within `image` of pixels that blend with what was below, so need a clear background
+    blended: Optional[Tuple[int, int, int, int]]
+
+
+class Overlay:
+    """RGBA overlay drawn in frame coordinates that allocates only what its marks cover.
+
+    Draw calls are recorded with their extent, then replayed onto a canvas
+    just covering them, shifted by whole pixels so the rendering matches a
+    full-frame overlay exactly. Pass it straight to composite().
+    """
+
+    def __init__(self, size: Tuple[int, int], color=(0, 0, 0, 0)):
+        self.size = size
+        self.color = color
+        self._ops = []
+        # Union of the recorded boxes, no longer grown once it (padded) covers the frame
+        self._bounds = None
+        self._covers_frame = False
+        # Bucket -> boxes of the marks reaching it, built the first time stamp() needs it
+        self._index = {}
+        self._indexed = 0
+
+    def textbbox(self, xy, text, **kwargs):
+        return _MEASURE.textbbox(xy, text, **kwargs)
+
+    def text(self, xy, text, **kwargs):
+        self._record(_text_box(xy, text, kwargs), 'text', xy, (text,), kwargs)
+
+    def rectangle(self, xy, **kwargs):
+        self._record(_points_box(xy), 'rectangle', xy, (), kwargs)
+
+    def rounded_rectangle(self, xy, **kwargs):
+        self._record(_points_box(xy), 'rounded_rectangle', xy, (), kwargs)
+
+    def ellipse(self, xy, **kwargs):
+        self._record(_points_box(xy), 'ellipse', xy, (), kwargs)
+
+    def polygon(self, xy, **kwargs):
+        self._record(_points_box(xy, kwargs.get('width', 1)), 'polygon', xy, (), kwargs)
+
+    def line(self, xy, **kwargs):
+        self._record(_points_box(xy, kwargs.get('width', 0)), 'line', xy, (), kwargs)
+
+    def paste(self, im: Image.Image, xy: Tuple[int, int], mask: Optional[Image.Image] = None):
+        """Image.paste of `im` at `xy`, replayed in order with the draw calls"""
+        x, y = xy
+        self._record((x, y, x + im.width, y + im.height), 'paste', xy, (im,), {'mask': mask})
+
+    def make_stamp(self, draw: Callable[..., None]) -> Optional[Stamp]:
+        """Rasterize the marks draw(target, x, y) makes around (x, y) once, for stamp().
+
+        `draw` gets an ImageDraw or an Overlay. The marks are drawn on the
+        overlay's background and again on its inverse: pixels that come out
+        the same replace whatever lies below them, and the rest blend with it.
+        Returns None when `draw` records nothing.
+        """
+        probe = Overlay(self.size, self.color)
+        draw(probe, 0, 0)
+        if not probe._ops:
+            return None
+        boxes = [box for box, *_ in probe._ops]
+        left = int(min(b[0] for b in boxes)) - OVERLAY_PAD
+        top = int(min(b[1] for b in boxes)) - OVERLAY_PAD
+        right = int(max(b[2] for b in boxes)) + 1 + OVERLAY_PAD
+        bottom = int(max(b[3] for b in boxes)) + 1 + OVERLAY_PAD
+        background = np.array(self.color, dtype=np.uint8)
+        renders = []
+        for color in (background, 255 - background):
+            canvas = Image.new('RGBA', (right - left, bottom - top), tuple(color.tolist()))
+            draw(ImageDraw.Draw(canvas), -left, -top)
+            renders.append((np.asarray(canvas), color))
+        (on_background, background), (on_inverse, inverse) = renders
+        solid = (on_background == on_inverse).all(-1)
+        touched = (on_background != background).any(-1) | (on_inverse != inverse).any(-1)
+        blended = touched & ~solid
+        # On a clear background, touched pixels take their value from the background render
+        replace = solid | (on_background != background).any(-1)
+        box = Image.fromarray(touched.astype(np.uint8)).getbbox()
+        if box is None:
+            return None
+        x0, y0, x1, y1 = box
+        blended_box = Image.fromarray(blended[y0:y1, x0:x1].astype(np.uint8)).getbbox()
+        if blended_box is not None:
+            blended_box = (blended_box[0] - OVERLAY_PAD, blended_box[1] - OVERLAY_PAD,
+                           blended_box[2] + OVERLAY_PAD, blended_box[3] + OVERLAY_PAD)
+        return Stamp(Image.fromarray(np.ascontiguousarray(on_background[y0:y1, x0:x1]), 'RGBA'),
+                     Image.fromarray((replace[y0:y1, x0:x1] * 255).astype(np.uint8), 'L'),
+                     (left + x0, top + y0), blended_box)
+
+    def stamp(self, stamp: Optional[Stamp], xy: Tuple[int, int]) -> bool:
+        """Paste `stamp` as if its marks were drawn around `xy`; False when that would differ.
+
+        The stamp's blended pixels need a clear background, so it is refused
+        when an earlier mark reaches them, and the caller draws the marks
+        instead. Solid pixels may cover earlier marks.
+        """
+        if stamp is None:
+            return True
+        x, y = xy[0] + stamp.offset[0], xy[1] + stamp.offset[1]
+        if stamp.blended is not None:
+            b = stamp.blended
+            if self._marks_near((x + b[0], y + b[1], x + b[2], y + b[3])):
+                return False
+        self.paste(stamp.image, (x, y), stamp.mask)
+        return True
+
+    def _buckets(self, box):
+        """Index buckets a box reaches, within the frame"""
+        cell = STAMP_INDEX_CELL
+        left, top = max(int(box[0]), 0) // cell, max(int(box[1]), 0) // cell
+        right = (min(int(box[2]), self.size[0]) - 1) // cell
+        bottom = (min(int(box[3]), self.size[1]) - 1) // cell
+        return [(col, row) for col in range(left, right + 1) for row in range(top, bottom + 1)]
+
+    def _marks_near(self, box) -> bool:
+        """Whether a recorded mark, padded by OVERLAY_PAD, reaches `box` inside the frame"""
+        for op in self._ops[self._indexed:]:
+            mark = op[0]
+            padded = (mark[0] - OVERLAY_PAD, mark[1] - OVERLAY_PAD, mark[2] + OVERLAY_PAD, mark[3] + OVERLAY_PAD)
+            for bucket in self._buckets(padded):
+                self._index.setdefault(bucket, []).append(mark)
+        self._indexed = len(self._ops)
+        return any(_overlaps(mark, box, OVERLAY_PAD)
+                   for bucket in self._buckets(box) for mark in self._index.get(bucket, ()))
+
+    def _record(self, box, method, xy, args, kwargs):
+        self._ops.append((box, method, xy, args, kwargs))
+        if self._covers_frame:
+            return
+        b = self._bounds
+        b = box if b is None else (min(b[0], box[0]), min(b[1], box[1]), max(b[2], box[2]), max(b[3], box[3]))
+        self._bounds = b
+        self._covers_frame = (b[0] <= OVERLAY_PAD and b[1] <= OVERLAY_PAD and
+                              b[2] + OVERLAY_PAD >= self.size[0] and b[3] + OVERLAY_PAD >= self.size[1])
+
+    def extent(self) -> Optional[Tuple[int, int, int, int]]:
+        """Box covering every recorded mark, clipped to the frame"""
+        if self._bounds is None:
+            return None
+        b = self._bounds
+        left = max(b[0] - OVERLAY_PAD, 0)
+        top = max(b[1] - OVERLAY_PAD, 0)
+        right = min(b[2] + OVERLAY_PAD, self.size[0])
+        bottom = min(b[3] + OVERLAY_PAD, self.size[1])
+        if left >= right or top >= bottom:
+            return None
+        return left, top, right, bottom
+
+    def render(self, region: Optional[Tuple[int, int, int, int]] = None
+               ) -> Optional[Tuple[Image.Image, Tuple[int, int]]]:
+        """(canvas, (x, y)) with the marks rasterized, or None when nothing lands in the frame.
+
+        With `region`, only the part of the overlay inside that box is
+        rasterized, replaying just the marks that reach it. When the marks
+        cover most of the region the canvas spans all of it, ready for a
+        plain full-frame blend.
+        """
+        box = self.extent()
+        if box is None:
+            return None
+        ops = self._ops
+        if region is None:
+            region = (0, 0) + tuple(self.size)
+        else:
+            box = (max(box[0], region[0]), max(box[1], region[1]),
+                   min(box[2], region[2]), min(box[3], region[3]))
+            if box[0] >= box[2] or box[1] >= box[3]:
+                return None
+            ops = [op for op in ops if _overlaps(op[0], box, OVERLAY_PAD)]
+        if _covers_most(box, region):
+            box = region
+        left, top, right, bottom = box
+        canvas = Image.new('RGBA', (right - left, bottom - top), self.color)
+        draw = ImageDraw.Draw(canvas)
+        for _, method, xy, args, kwargs in ops:
+            if method == 'paste':
+                canvas.paste(args[0], tuple(_shift(xy, -left, -top)), **kwargs)
+            else:
+                getattr(draw, method)(_shift(xy, -left, -top), *args, **kwargs)
+        return canvas, (left, top)
+
+
+Layer = Union[Image.Image, Overlay, Tuple[Image.Image, Tuple[int, int]], Tuple[int, int, int, int]]
+
+
+def tint_lut(color: Tuple[int, int, int, int]) -> List[int]:
+    """Image.point table for a solid RGBA color blended over an opaque RGB image.
+
+    Over an opaque base alpha_composite reduces to round((c·a + v·(255 − a)) / 255).
+    """
+    alpha = color[3]
+    return [(c * alpha + v * (255 - alpha) + 127) // 255 for c in color[:3] for v in range(256)]
+
+
+def _is_color(layer) -> bool:
+    return isinstance(layer, tuple) and len(layer) == 4 and all(isinstance(v, int) for v in layer)
+
+
+def _covers_most(box, region) -> bool:
+    area = (region[2] - region[0]) * (region[3] - region[1])
+    return (box[2] - box[0]) * (box[3] - box[1]) >= FULL_FRAME_SHARE * area
+
+
+def _translucent(img: Image.Image) -> bool:
+    return img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+
+
+def composite(img: Image.Image, *layers: Layer) -> Image.Image:
+    """Blend layers over `img` bottom to top and return a new RGB image.
+
+    A layer is an RGBA image placed at the top-left corner, an (image, (x, y))
+    pair placed at an offset, an Overlay, or an RGBA color tuple that tints
+    the whole frame. Only the part of each layer inside its alpha bounding
+    box is converted and blended; the rest of the frame is never touched.
+    """
+    if large_image.is_large(img.size) and not _translucent(img):
+        return _composite_strips(img, layers)
+    return _composite(img, layers)
+
+
+class _Placed(NamedTuple):
+    """A layer image at its offset, with the box its marks cover inside it when already known"""
+    image: Image.Image
+    xy: Tuple[int, int]
+    marks: Optional[Tuple[int, int, int, int]] = None
+
+
+def _placed(layer):
+    """Colors pass through; other layers become _Placed, or None when they draw nothing"""
+    if _is_color(layer) or isinstance(layer, _Placed):
+        return layer
+    if isinstance(layer, Overlay):
+        rendered = layer.render()
+        if rendered is None:
+            return None
+        canvas, xy = rendered
+        # The canvas is already cut to the marks; scanning its alpha would find about the same box
+        return _Placed(canvas, xy, (0, 0) + canvas.size)
+    image, xy = layer if isinstance(layer, tuple) else (layer, (0, 0))
+    return _Placed(image, xy)
+
+
+def _composite(img: Image.Image, layers) -> Image.Image:
+    layers = [layer for layer in map(_placed, layers) if layer is not None]
+    if _translucent(img):
+        # A translucent base needs the full formula; keep Pillow's full-frame path
+        out = img.convert('RGBA')
+        for layer in layers:
+            if _is_color(layer):
+                layer = _Placed(Image.new('RGBA', out.size, layer), (0, 0))
+            out.alpha_composite(layer.image, dest=layer.xy)
+        return out.convert('RGB')
+
+    # `out` is only copied once something is blended in place
+    out, owned = (img, False) if img.mode == 'RGB' else (img.convert('RGB'), True)
+    frame = (0, 0) + out.size
+    for layer in layers:
+        if _is_color(layer):
+            out, owned = out.point(tint_lut(layer)), True
+            continue
+        image, (x, y), marks = layer
+        if marks is None:
+            marks = image.getchannel('A').getbbox()
+            if marks is None:
+                continue
+        # Clip the layer's visible box to the frame
+        left, top = max(x + marks[0], 0), max(y + marks[1], 0)
+        right, bottom = min(x + marks[2], out.width), min(y + marks[3], out.height)
+        if left >= right or top >= bottom:
+            continue
+        box = (left, top, right, bottom)
+        if _covers_most(box, frame):
+            base = out.convert('RGBA')
+            if (x, y) == (0, 0) and image.size == out.size:
+                base = Image.alpha_composite(base, image)
+            else:
+                base.alpha_composite(image, dest=(left, top), source=(left - x, top - y, right - x, bottom - y))
+            out, owned = base.convert('RGB'), True
+            continue
+        region = Image.alpha_composite(out.crop(box).convert('RGBA'),
+                                       image.crop((left - x, top - y, right - x, bottom - y)))
+        if not owned:
+            out, owned = out.copy(), True
+        out.paste(region.convert('RGB'), box)
+    return out if owned else out.copy()
+
+
+def _strip_layer(layer, top: int, bottom: int):
+    """The part of a layer covering rows top..bottom, positioned relative to the strip, or None"""
+    if _is_color(layer):
+        return layer
+    if isinstance(layer, Overlay):
+        rendered = layer.render((0, top, layer.size[0], bottom))
+        if rendered is None:
+            return None
+        canvas, (x, y) = rendered
+        return _Placed(canvas, (x, y - top), (0, 0) + canvas.size)
+    image, (x, y) = layer if isinstance(layer, tuple) else (layer, (0, 0))
+    first, last = max(top - y, 0), min(bottom - y, image.height)
+    if first >= last:
+        return None
+    return _Placed(image.crop((0, first, image.width, last)), (x, y + first - top))
+
+
+def _composite_strips(img: Image.Image, layers) -> Image.Image:
+    """composite() for large frames: render and blend one strip of rows at a time"""
+    width, height = img.size
+    out = Image.new('RGB', img.size)
+    for top in range(0, height, large_image.STRIP_ROWS):
+        bottom = min(top + large_image.STRIP_ROWS, height)
+        parts = [_strip_layer(layer, top, bottom) for layer in layers]
+        strip = _composite(img.crop((0, top, width, bottom)), [part for part in parts if part is not None])
+        out.paste(strip, (0, top))
+    return out
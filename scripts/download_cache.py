@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+On-disk download cache for demo image sources
+Stores raw response bytes keyed by URL + query parameters, revalidates with
+ETag/Last-Modified, evicts least recently used entries past a size cap and can
+run fully offline from a warm cache. Bodies are streamed into a temp file
+and committed in place; fetcher.py does the HTTP side
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_CACHE_DIR = os.getenv('DEMO_CACHE_DIR', '.cache/demo-downloads')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE = 24 * 60 * 60
+# Credentials vary per developer but never change the response
+IGNORED_PARAMS = {'client_id'}
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode when a URL has no cached entry"""
+
+
+class DownloadCache:
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: Optional[float] = DEFAULT_MAX_AGE, offline: bool = False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.offline = offline or os.getenv('DEMO_OFFLINE') == '1'
+        self._lock = threading.Lock()
+
+    def key(self, url: str, params: Optional[Dict[str, str]] = None) -> str:
+        """Stable key from the URL with its query merged with `params` and sorted"""
+        parts = urlsplit(url)
+        query = parse_qsl(parts.query, keep_blank_values=True) + list((params or {}).items())
+        query = sorted((k, str(v)) for k, v in query if k not in IGNORED_PARAMS)
+        canonical = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.root, key[:2], key)
+        return base + '.bin', base + '.json'
+
+    def lookup(self, url: str, params: Optional[Dict[str, str]] = None):
+        """Return (bytes, meta) for a cached URL, or (None, None)"""
+        data_path, meta_path = self._paths(self.key(url, params))
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(data_path, 'rb') as f:
+                data = f.read()
+        except (OSError, ValueError):
+            return None, None
+        # Access time drives LRU eviction
+        os.utime(data_path)
+        return data, meta
+
+    def temp_path(self, url: str, params: Optional[Dict[str, str]] = None) -> str:
+        """Unique temp file next to the URL's entry, for streaming a body into before commit()"""
+        data_path, _ = self._paths(self.key(url, params))
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=os.path.basename(data_path) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(data_path))
+        os.close(fd)
+        return path
+
+    def commit(self, url: str, params: Optional[Dict[str, str]], temp_path: str, headers) -> str:
+        """Move a body written to temp_path() into the cache; returns the entry's data path"""
+        data_path, meta_path = self._paths(self.key(url, params))
+        meta = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'content_type': headers.get('Content-Type'),
+            'size': os.path.getsize(temp_path),
+            'fetched_at': time.time(),
+        }
+        # Rename into place so concurrent readers never see partial entries
+        with open(temp_path + '.json', 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, data_path)
+        os.replace(temp_path + '.json', meta_path)
+        self.evict()
+        return data_path
+
+    def touch(self, url: str, params: Optional[Dict[str, str]], meta: dict):
+        """Restart an entry's max_age after the server confirmed it is still valid"""
+        _, meta_path = self._paths(self.key(url, params))
+        meta['fetched_at'] = time.time()
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+
+    def is_fresh(self, meta: dict) -> bool:
+        """Whether an entry is young enough to serve without asking the server"""
+        return self.max_age is not None and time.time() - meta['fetched_at'] < self.max_age
+
+    def validators(self, meta: dict) -> Dict[str, str]:
+        """Conditional request headers that let the server answer 304 for an unchanged entry"""
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if not name.endswith('.bin'):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                for p in (path, path[:-len('.bin')] + '.json'):
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+                total -= size
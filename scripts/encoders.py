@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Pluggable image encoders for the demo assets
+WebP, AVIF, JPEG (progressive, optimized) and PNG behind one interface, with
+an optional per-image search that binary-searches quality to reach a target
+SSIM or fit a byte budget instead of spending a fixed quality on every image
+"""
+
+import io
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+
+try:
+    # Pillow < 11.3 has no built-in AVIF; the plugin registers it
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+# Window and constants of the reference SSIM implementation
+SSIM_WINDOW = 7
+SSIM_K1, SSIM_K2 = 0.01, 0.03
+
+
+class Encoder:
+    def __init__(self, name: str, pil_format: str, ext: str, params: dict,
+                 quality: Optional[int] = None, quality_range=(1, 100)):
+        self.name = name
+        self.pil_format = pil_format
+        self.ext = ext
+        self.params = params
+        self.quality = quality
+        self.quality_range = quality_range
+
+    @property
+    def available(self) -> bool:
+        Image.init()
+        return self.pil_format in Image.SAVE
+
+    def save_params(self, quality: Optional[int] = None) -> dict:
+        """Keyword arguments for Image.save; quality defaults to the encoder's own"""
+        if self.quality is None:
+            return dict(self.params)
+        return {'quality': quality or self.quality, **self.params}
+
+    def encode(self, img: Image.Image, quality: Optional[int] = None) -> bytes:
+        buf = io.BytesIO()
+        img.save(buf, self.pil_format, **self.save_params(quality))
+        return buf.getvalue()
+
+
+ENCODERS: Dict[str, Encoder] = {
+    'webp': Encoder('webp', 'WEBP', '.webp', {'method': 6}, quality=86),
+    'avif': Encoder('avif', 'AVIF', '.avif', {'speed': 6}, quality=60),
+    'jpeg': Encoder('jpeg', 'JPEG', '.jpg', {'progressive': True, 'optimize': True}, quality=90),
+    'png': Encoder('png', 'PNG', '.png', {'optimize': True}),
+}
+# Bulk before/after corpora (batch_watermark.py, generate_demo_images.py): baseline
+# JPEG at high quality and unoptimized PNG, since a progressive, optimized JPEG encode
+# costs about 7x as long
+CORPUS_ENCODERS: Dict[str, Encoder] = {
+    'jpeg': Encoder('jpeg', 'JPEG', '.jpg', {}, quality=95),
+    'webp': ENCODERS['webp'],
+    'png': Encoder('png', 'PNG', '.png', {}),
+}
+
+
+def get_encoder(name: str) -> Encoder:
+    encoder = ENCODERS.get(name)
+    if encoder is None:
+        raise ValueError(f"unknown format {name!r} (choose from {', '.join(ENCODERS)})")
+    if not encoder.available:
+        raise ValueError(f"{encoder.pil_format} encoding needs Pillow >= 11.3 built with libavif, "
+                         f"or the pillow-avif-plugin package")
+    return encoder
+
+
+def _luma(img: Image.Image) -> np.ndarray:
+    return np.asarray(img.convert('L'), dtype=np.float64)
+
+
+def _window_mean(x: np.ndarray) -> np.ndarray:
+    """Mean over every SSIM_WINDOW×SSIM_WINDOW window (valid positions only), via an integral image"""
+    s = np.pad(x, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    w = SSIM_WINDOW
+    return (s[w:, w:] - s[:-w, w:] - s[w:, :-w] + s[:-w, :-w]) / (w * w)
+
+
+def ssim(reference: np.ndarray, test: np.ndarray) -> float:
+    """Mean SSIM of two luma arrays, with uniform windows and sample covariance"""
+    n = SSIM_WINDOW * SSIM_WINDOW
+    cov = n / (n - 1)
+    mx, my = _window_mean(reference), _window_mean(test)
+    vx = cov * (_window_mean(reference * reference) - mx * mx)
+    vy = cov * (_window_mean(test * test) - my * my)
+    vxy = cov * (_window_mean(reference * test) - mx * my)
+    c1, c2 = (SSIM_K1 * 255) ** 2, (SSIM_K2 * 255) ** 2
+    s = ((2 * mx * my + c1) * (2 * vxy + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+    return float(s.mean())
+
+
+class EncodeResult(NamedTuple):
+    data: bytes
+    quality: Optional[int]
+    ssim: Optional[float]
+
+
+def encode(img: Image.Image, encoder: Encoder, quality: Optional[int] = None,
+           target_ssim: Optional[float] = None, max_bytes: Optional[int] = None) -> EncodeResult:
+    """Encode `img`, searching quality when a target SSIM or byte budget is given.
+
+    With a target SSIM the lowest quality that reaches it wins; with a byte
+    budget the highest quality that fits. When both are set and the SSIM
+    target does not fit the budget, the budget wins. Lossless encoders and
+    calls without targets encode once at `quality` (or the encoder default).
+    """
+    if encoder.quality is None or (target_ssim is None and max_bytes is None):
+        return EncodeResult(encoder.encode(img, quality), quality or encoder.quality, None)
+
+    reference = _luma(img)
+    probes = {}
+
+    def probe(q):
+        if q not in probes:
+            data = encoder.encode(img, q)
+            with Image.open(io.BytesIO(data)) as decoded:
+                score = ssim(reference, _luma(decoded))
+            probes[q] = EncodeResult(data, q, score)
+        return probes[q]
+
+    def search(accept, prefer_low):
+        """Binary search for the lowest (or highest) quality `accept` holds for, assuming monotonicity"""
+        lo, hi = encoder.quality_range
+        best = None
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if accept(probe(mid)):
+                best = mid
+                if prefer_low:
+                    hi = mid - 1
+                else:
+                    lo = mid + 1
+            elif prefer_low:
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        return best
+
+    low, high = encoder.quality_range
+    if target_ssim is not None:
+        q = search(lambda r: r.ssim >= target_ssim, prefer_low=True)
+        result = probe(high if q is None else q)
+        if max_bytes is None or len(result.data) <= max_bytes:
+            return result
+    q = search(lambda r: len(r.data) <= max_bytes, prefer_low=False)
+    return probe(low if q is None else q)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Async fetch layer for the demo image sources
+Downloads run as asyncio tasks on a background event loop, so callers keep
+doing CPU work while they are in flight: a semaphore bounds how many run at
+once, request starts are spaced by a minimum interval, transient failures
+retry with jittered exponential backoff, and bodies stream straight into the
+DownloadCache. HTTP goes through a pluggable Transport; the default one
+keeps pooled keep-alive connections in a requests.Session
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import BinaryIO, Dict, Mapping, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from download_cache import CacheMiss, DownloadCache
+
+# Bytes per read while streaming a body to disk
+CHUNK_SIZE = 256 * 1024
+# Statuses worth another attempt; any other non-2xx answer fails at once
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class HTTPStatusError(Exception):
+    """Raised when a URL answers with a non-success status, after any retries"""
+
+    def __init__(self, url: str, status: int):
+        super().__init__(f"HTTP {status} for {url}")
+        self.url = url
+        self.status = status
+
+
+class Transport(ABC):
+    """One HTTP GET: writes a 200 body to `sink` and returns (status, headers).
+
+    request() may be a plain method, which the fetcher runs on its worker
+    threads, or a coroutine, which it awaits on the loop. Network failures
+    raise OSError (requests' exceptions already do).
+    """
+
+    @abstractmethod
+    def request(self, url: str, params: Optional[Dict[str, str]], headers: Dict[str, str],
+                sink: BinaryIO) -> Tuple[int, Mapping[str, str]]:
+        """Perform the GET, streaming a 200 body into `sink`"""
+
+    def close(self):
+        pass
+
+
+class SessionTransport(Transport):
+    """requests.Session whose connection pool holds `pool_size` keep-alive connections per host"""
+
+    def __init__(self, pool_size: int = 4, timeout: Tuple[float, float] = (10, 30)):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, url, params, headers, sink):
+        with self.session.get(url, params=params, headers=headers, timeout=self.timeout,
+                              stream=True) as response:
+            if response.status_code == 200:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    sink.write(chunk)
+            return response.status_code, response.headers
+
+    def close(self):
+        self.session.close()
+
+
+class RetryPolicy:
+    """Up to `attempts` tries, waiting a random 0..base·2^n seconds (at most `cap`) before retry n"""
+
+    def __init__(self, attempts: int = 4, base: float = 0.5, cap: float = 10.0):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt: int, headers: Optional[Mapping[str, str]] = None) -> float:
+        """Seconds to wait after failed attempt `attempt` (0-based); a Retry-After header wins"""
+        retry_after = retry_after_seconds(headers or {})
+        if retry_after is not None:
+            return min(retry_after, self.cap)
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """Retry-After as seconds from now, whether given as a delay or an HTTP date"""
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class Fetcher:
+    """Cached, concurrent downloads on a background asyncio loop.
+
+    submit() returns a concurrent.futures.Future for the body, so fetches
+    overlap whatever the calling thread does next; coroutines can await
+    fetch() directly through spawn(). The loop, its worker threads and the
+    default transport are created on first use, so settings can be changed
+    until then.
+    """
+
+    def __init__(self, cache: DownloadCache = None, transport: Transport = None,
+                 concurrency: int = 4, interval: float = 0.0, retry: RetryPolicy = None):
+        self.cache = cache or DownloadCache()
+        self.transport = transport
+        self.concurrency = concurrency
+        self.interval = interval
+        self.retry = retry or RetryPolicy()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._next_start = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                if self.transport is None:
+                    self.transport = SessionTransport(self.concurrency)
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(ThreadPoolExecutor(self.concurrency, thread_name_prefix='fetch'))
+                self._slots = asyncio.Semaphore(self.concurrency)
+                self._pacing = asyncio.Lock()
+                self._thread = threading.Thread(target=loop.run_forever, name='fetch-loop', daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def spawn(self, coro) -> Future:
+        """Run a coroutine on the fetch loop; the Future resolves to its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def submit(self, url: str, params: Optional[Dict[str, str]] = None) -> Future:
+        """Start fetching `url` in the background; the Future resolves to the body bytes"""
+        return self.spawn(self.fetch(url, params))
+
+    def get(self, url: str, params: Optional[Dict[str, str]] = None) -> bytes:
+        """Blocking fetch of one URL"""
+        return self.submit(url, params).result()
+
+    def close(self):
+        """Stop the loop and release its threads and connections"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+        self.transport.close()
+
+    async def fetch(self, url: str, params: Optional[Dict[str, str]] = None) -> bytes:
+        """Body of `url` from the cache when fresh or still valid upstream, else downloaded into it"""
+        data, meta = self.cache.lookup(url, params)
+        if self.cache.offline:
+            if data is None:
+                raise CacheMiss(f"offline and not cached: {url}")
+            return data
+        if data is not None and self.cache.is_fresh(meta):
+            return data
+
+        headers = self.cache.validators(meta) if data is not None else {}
+        try:
+            status, response_headers, path = await self._download(url, params, headers)
+        except OSError:
+            if data is not None:
+                # Serve stale rather than fail when the network is down
+                return data
+            raise
+        if status == 304:
+            os.remove(path)
+            if data is not None:
+                self.cache.touch(url, params, meta)
+                return data
+            raise HTTPStatusError(url, status)
+        loop = asyncio.get_running_loop()
+        path = await loop.run_in_executor(None, self.cache.commit, url, params, path, response_headers)
+        return await loop.run_in_executor(None, _read, path)
+
+    async def _download(self, url, params, headers):
+        """(status, headers, temp path holding the body) for a 200 or 304, retrying transient failures"""
+        for attempt in range(self.retry.attempts):
+            last = attempt == self.retry.attempts - 1
+            await self._pace()
+            async with self._slots:
+                path = self.cache.temp_path(url, params)
+                try:
+                    status, response_headers = await self._request(url, params, headers, path)
+                except OSError:
+                    os.remove(path)
+                    if last:
+                        raise
+                    delay = self.retry.delay(attempt)
+                else:
+                    if status in (200, 304):
+                        return status, response_headers, path
+                    os.remove(path)
+                    if last or status not in RETRY_STATUSES:
+                        raise HTTPStatusError(url, status)
+                    delay = self.retry.delay(attempt, response_headers)
+            # Back off without holding a slot
+            await asyncio.sleep(delay)
+
+    async def _request(self, url, params, headers, path):
+        request = self.transport.request
+        with open(path, 'wb') as sink:
+            if asyncio.iscoroutinefunction(request):
+                return await request(url, params, headers, sink)
+            return await asyncio.get_running_loop().run_in_executor(None, request, url, params, headers, sink)
+
+    async def _pace(self):
+        """Wait until at least `interval` seconds have passed since the previous request started"""
+        if not self.interval:
+            return
+        async with self._pacing:
+            now = time.monotonic()
+            if self._next_start > now:
+                await asyncio.sleep(self._next_start - now)
+                now = self._next_start
+            self._next_start = now + self.interval
+
+
+def _read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Finishing pass for the synthetic demo photos
+Multiplies in lighting, adds photographic grain and clips in one pass over a
+uint8 frame, a row tile at a time through reused float32 buffers, instead of
+building full-frame float64 temporaries for each step
+"""
+
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from gradients import TILE_ROWS
+
+# lighting(top, bottom) -> per-pixel factor for those rows, shaped (bottom - top, width)
+Lighting = Callable[[int, int], np.ndarray]
+
+
+def corner_light(size: Tuple[int, int], falloff: float) -> Lighting:
+    """Light from the top-left corner: full at the corner, 1 - falloff at the opposite one"""
+    width, height = size
+    xs = np.arange(width, dtype=np.float32)[None, :]
+    scale = np.float32(falloff / (width + height))
+
+    def light(top, bottom):
+        ys = np.arange(top, bottom, dtype=np.float32)[:, None]
+        return 1 - (xs + ys) * scale
+    return light
+
+
+def finish(pixels: np.ndarray, rng: np.random.Generator, noise: float = 0.0,
+           lighting: Optional[Lighting] = None) -> np.ndarray:
+    """Apply `lighting` and Gaussian grain of std `noise` to an (H, W, C) uint8 array in place.
+
+    Values are clipped to 0..255 and truncated like astype(np.uint8). Grain is
+    drawn tile by tile from `rng`, which yields the same stream as one
+    full-frame draw, so the tile size never changes the output.
+    """
+    height, width, channels = pixels.shape
+    tile_buf = np.empty((min(TILE_ROWS, height), width, channels), dtype=np.float32)
+    grain_buf = np.empty_like(tile_buf) if noise else None
+    for top in range(0, height, TILE_ROWS):
+        bottom = min(top + TILE_ROWS, height)
+        tile = tile_buf[:bottom - top]
+        tile[...] = pixels[top:bottom]
+        if lighting is not None:
+            tile *= lighting(top, bottom)[..., None]
+        if noise:
+            grain = grain_buf[:bottom - top]
+            rng.standard_normal(dtype=np.float32, out=grain)
+            grain *= noise
+            tile += grain
+        np.clip(tile, 0, 255, out=tile)
+        pixels[top:bottom] = tile
+    return pixels
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Shared font registry for the demo generators
+Resolves a list of candidate font files once, memoizes loaded fonts per
+(path, size) and counts fallbacks to Pillow's default bitmap font, which
+silently changes glyph metrics between hosts
+"""
+
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from PIL import ImageFont
+
+DEFAULT_MAX_FONTS = 64
+
+
+class FontRegistry:
+    def __init__(self, candidates: List[str], maxsize: int = DEFAULT_MAX_FONTS):
+        self.candidates = list(candidates)
+        self.maxsize = maxsize
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+        self._resolved = False
+        self._path = None
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    @property
+    def path(self) -> Optional[str]:
+        """First candidate that FreeType can load, or None when only the default font is left"""
+        if not self._resolved:
+            for candidate in self.candidates:
+                try:
+                    ImageFont.truetype(candidate, 12)
+                except Exception:
+                    continue
+                self._path = candidate
+                break
+            self._resolved = True
+            if self._path is None:
+                print(f"Warning: none of {self.candidates} could be loaded, using default font")
+        return self._path
+
+    def get(self, size: int):
+        """Font at `size`, loaded once and kept in an LRU of at most maxsize entries"""
+        path = self.path
+        key = (path, size)
+        with self._lock:
+            if path is None:
+                self.fallbacks += 1
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+        if path is None:
+            font = ImageFont.load_default()
+        else:
+            font = ImageFont.truetype(path, size)
+        with self._lock:
+            self._fonts[key] = font
+            while len(self._fonts) > self.maxsize:
+                self._fonts.popitem(last=False)
+        return font
+
+    def stats(self) -> dict:
+        return {
+            'path': self.path,
+            'hits': self.hits,
+            'misses': self.misses,
+            'fallbacks': self.fallbacks,
+            'cached': len(self._fonts),
+        }
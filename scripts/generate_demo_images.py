@@ -4,17 +4,33 @@ Demo Image Generator with Watermarks
 Generates demo images with various watermark types for testing watermark removal
 """
 
+import argparse
 import os
 import sys
 import json
-import requests
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+import inspect
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from PIL import Image, ImageDraw, ImageFilter
 import numpy as np
 from io import BytesIO
-import random
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Optional
+
+from build_manifest import BuildManifest, digest, file_digest
+from compositing import Overlay, composite
+from download_cache import DownloadCache
+from encoders import CORPUS_ENCODERS
+from fetcher import Fetcher, HTTPStatusError
+import finishing
+from font_registry import FontRegistry
+import gradients
+import recipes
+from seeding import DEFAULT_SEED, asset_rng
+from sprite_cache import SPRITES
 
 # Configuration
+# Bump when a change to this script should rebuild every output
+BUILD_VERSION = '1'
 UNSPLASH_ACCESS_KEY = os.getenv('UNSPLASH_ACCESS_KEY', 'YOUR_ACCESS_KEY_HERE')
 OUTPUT_DIR = 'public/demo/generated'
 IMAGE_CATEGORIES = [
@@ -54,9 +70,29 @@ WATERMARK_TYPES = {
     }
 }
 
+FONTS = FontRegistry(['/System/Library/Fonts/Helvetica.ttc'])
+DEFAULT_SIZE = (800, 600)
+# --format name -> encoder; settings live in encoders.CORPUS_ENCODERS
+OUTPUT_FORMATS = {
+    'jpg': CORPUS_ENCODERS['jpeg'],
+    'webp': CORPUS_ENCODERS['webp'],
+    'png': CORPUS_ENCODERS['png'],
+}
+METADATA_LOG = 'metadata.jsonl'
+
+# Variants written for every category, from recipes/demo_images.json:
+# (name, generator method, positional args)
+DEMO_VARIANTS = recipes.style_variants(recipes.load_recipe(recipes.recipe_path('demo_images')))
+
 class DemoImageGenerator:
-    def __init__(self):
-        self.ensure_output_dir()
+    def __init__(self, cache: DownloadCache = None, force: bool = False, create_dirs: bool = True,
+                 seed: int = DEFAULT_SEED, fetcher: Fetcher = None):
+        self.cache = cache or DownloadCache()
+        self.fetcher = fetcher or Fetcher(self.cache)
+        self.seed = seed
+        self.manifest = BuildManifest(force=force)
+        if create_dirs:
+            self.ensure_output_dir()
         
     def ensure_output_dir(self):
         """Create output directory if it doesn't exist"""
@@ -64,37 +100,47 @@ class DemoImageGenerator:
             os.makedirs(OUTPUT_DIR)
             print(f"Created output directory: {OUTPUT_DIR}")
     
-    def download_unsplash_image(self, query: str, size: Tuple[int, int] = (800, 600)) -> Image.Image:
-        """Download a royalty-free image from Unsplash"""
-        if UNSPLASH_ACCESS_KEY == 'YOUR_ACCESS_KEY_HERE':
-            print("Note: Using placeholder image. Set UNSPLASH_ACCESS_KEY for real images.")
-            return self.create_placeholder_image(query, size)
-        
-        url = f"https://api.unsplash.com/photos/random"
+    async def fetch_unsplash(self, query: str) -> bytes:
+        """Bytes of a random landscape Unsplash photo for `query`: the API call, then the photo"""
+        url = "https://api.unsplash.com/photos/random"
         params = {
             'query': query,
             'orientation': 'landscape',
             'client_id': UNSPLASH_ACCESS_KEY
         }
+        data = json.loads(await self.fetcher.fetch(url, params))
+        return await self.fetcher.fetch(data['urls']['regular'])
+    
+    def request_unsplash_image(self, query: str) -> Optional[Future]:
+        """Start downloading a photo for `query` in the background; None without an access key"""
+        if UNSPLASH_ACCESS_KEY == 'YOUR_ACCESS_KEY_HERE':
+            return None
+        return self.fetcher.spawn(self.fetch_unsplash(query))
+    
+    def download_unsplash_image(self, query: str, size: Tuple[int, int] = DEFAULT_SIZE,
+                                pending: Optional[Future] = None) -> Image.Image:
+        """Download a royalty-free image from Unsplash, or finish a request_unsplash_image() download"""
+        if pending is None:
+            pending = self.request_unsplash_image(query)
+        if pending is None:
+            print("Note: Using placeholder image. Set UNSPLASH_ACCESS_KEY for real images.")
+            return self.create_placeholder_image(query, size)
         
         try:
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                image_url = data['urls']['regular']
-                img_response = requests.get(image_url)
-                return Image.open(BytesIO(img_response.content)).resize(size, Image.Resampling.LANCZOS)
-            else:
-                print(f"Failed to fetch from Unsplash: {response.status_code}")
-                return self.create_placeholder_image(query, size)
+            img_data = pending.result()
+            return Image.open(BytesIO(img_data)).resize(size, Image.Resampling.LANCZOS)
+        except HTTPStatusError as e:
+            print(f"Failed to fetch from Unsplash: {e.status}")
+            return self.create_placeholder_image(query, size)
         except Exception as e:
             print(f"Error downloading image: {e}")
             return self.create_placeholder_image(query, size)
     
-    def create_placeholder_image(self, category: str, size: Tuple[int, int]) -> Image.Image:
-        """Create a placeholder image with gradient background"""
-        img = Image.new('RGB', size)
-        draw = ImageDraw.Draw(img)
+    def create_placeholder_image(self, category: str, size: Tuple[int, int],
+                                 rng: np.random.Generator = None) -> Image.Image:
+        """Create a placeholder image with gradient background; `rng` defaults to the stream for (category, size)"""
+        if rng is None:
+            rng = asset_rng(self.seed, 'placeholder', category, size)
         
         # Create gradient background
         colors = {
@@ -110,27 +156,15 @@ class DemoImageGenerator:
         gradient_colors = colors.get(category.split()[0].lower(), colors['abstract'])
         
         # Create vertical gradient
-        for y in range(size[1]):
-            ratio = y / size[1]
-            r = int(gradient_colors[0][0] * (1 - ratio) + gradient_colors[1][0] * ratio)
-            g = int(gradient_colors[0][1] * (1 - ratio) + gradient_colors[1][1] * ratio)
-            b = int(gradient_colors[0][2] * (1 - ratio) + gradient_colors[1][2] * ratio)
-            draw.rectangle([(0, y), (size[0], y + 1)], fill=(r, g, b))
-        
-        # Add some texture using numpy for noise
-        img_array = np.array(img)
-        noise = np.random.normal(0, 5, img_array.shape)
-        img_array = np.clip(img_array + noise, 0, 255).astype(np.uint8)
-        img = Image.fromarray(img_array)
-        
-        # Recreate draw object after image conversion
+        img_array = gradients.linear(size, gradient_colors)
+        
+        # Add some texture with noise, in place
+        img = Image.fromarray(finishing.finish(img_array, rng, noise=5))
+        
         draw = ImageDraw.Draw(img)
         
         # Add category text
-        try:
-            font = ImageFont.truetype('/System/Library/Fonts/Helvetica.ttc', 40)
-        except:
-            font = ImageFont.load_default()
+        font = FONTS.get(40)
         
         text = category.upper()
         bbox = draw.textbbox((0, 0), text, font=font)
@@ -149,16 +183,13 @@ class DemoImageGenerator:
     def add_text_watermark(self, img: Image.Image, text: str, 
                           position: str = 'center', opacity: float = 0.5) -> Image.Image:
         """Add a text watermark to the image"""
-        # Create a transparent overlay
-        txt_layer = Image.new('RGBA', img.size, (255, 255, 255, 0))
-        draw = ImageDraw.Draw(txt_layer)
+        # Create a transparent overlay that only allocates the text's extent
+        txt_layer = Overlay(img.size, (255, 255, 255, 0))
+        draw = txt_layer
         
-        # Try to use a nice font
-        try:
-            font_size = min(img.size) // 10
-            font = ImageFont.truetype('/System/Library/Fonts/Helvetica.ttc', font_size)
-        except:
-            font = ImageFont.load_default()
+        # Font from the shared registry
+        font_size = min(img.size) // 10
+        font = FONTS.get(font_size)
         
         # Calculate text position
         bbox = draw.textbbox((0, 0), text, font=font)
@@ -179,10 +210,7 @@ class DemoImageGenerator:
         draw.text(pos, text, fill=(255, 255, 255, alpha), font=font, stroke_width=2, stroke_fill=(0, 0, 0, alpha))
         
         # Composite the watermark
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-        watermarked = Image.alpha_composite(img, txt_layer)
-        return watermarked.convert('RGB')
+        return composite(img, txt_layer)
     
     def add_pattern_watermark(self, img: Image.Image, text: str = 'WATERMARK',
                              pattern: str = 'diagonal', opacity: float = 0.3,
@@ -191,23 +219,17 @@ class DemoImageGenerator:
         txt_layer = Image.new('RGBA', img.size, (255, 255, 255, 0))
         draw = ImageDraw.Draw(txt_layer)
         
-        try:
-            font_size = spacing // 6
-            font = ImageFont.truetype('/System/Library/Fonts/Helvetica.ttc', font_size)
-        except:
-            font = ImageFont.load_default()
+        font_size = spacing // 6
+        font = FONTS.get(font_size)
         
         alpha = int(255 * opacity)
         
         if pattern == 'diagonal':
-            # Diagonal pattern
+            # Diagonal pattern: rotate the text once and reuse it at every position
+            rotated = SPRITES.get(text, font, (255, 255, 255, alpha), 45,
+                                  canvas=(len(text) * font_size, font_size * 2))
             for y in range(-img.size[1], img.size[1] * 2, spacing):
                 for x in range(-img.size[0], img.size[0] * 2, spacing):
-                    # Rotate text for diagonal effect
-                    temp_img = Image.new('RGBA', (len(text) * font_size, font_size * 2), (255, 255, 255, 0))
-                    temp_draw = ImageDraw.Draw(temp_img)
-                    temp_draw.text((0, 0), text, fill=(255, 255, 255, alpha), font=font)
-                    rotated = temp_img.rotate(45, expand=1)
                     txt_layer.paste(rotated, (x, y), rotated)
         else:
             # Grid pattern
@@ -215,10 +237,7 @@ class DemoImageGenerator:
                 for x in range(0, img.size[0], spacing):
                     draw.text((x, y), text, fill=(255, 255, 255, alpha), font=font)
         
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-        watermarked = Image.alpha_composite(img, txt_layer)
-        return watermarked.convert('RGB')
+        return composite(img, txt_layer)
     
     def add_logo_watermark(self, img: Image.Image, opacity: float = 0.4) -> Image.Image:
         """Add a logo-style watermark"""
@@ -237,14 +256,13 @@ class DemoImageGenerator:
                      (logo_size-20, logo_size-20)], 
                     fill=(255, 255, 255, alpha//2))
         
-        # Place logo in corner
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-        img_with_logo = img.copy()
+        # Place logo in corner; a masked paste blends each RGB channel the same
+        # way whether or not the image carries alpha, so paste straight into RGB
+        img_with_logo = img.convert('RGB')
         img_with_logo.paste(logo, (img.size[0] - logo_size - 20, 
                                    img.size[1] - logo_size - 20), logo)
         
-        return img_with_logo.convert('RGB')
+        return img_with_logo
     
     def add_embedded_watermark(self, img: Image.Image, text: str = 'PROTECTED',
                               opacity: float = 0.1) -> Image.Image:
@@ -253,11 +271,8 @@ class DemoImageGenerator:
         txt_layer = Image.new('RGBA', img.size, (255, 255, 255, 0))
         draw = ImageDraw.Draw(txt_layer)
         
-        try:
-            font_size = min(img.size) // 3
-            font = ImageFont.truetype('/System/Library/Fonts/Helvetica.ttc', font_size)
-        except:
-            font = ImageFont.load_default()
+        font_size = min(img.size) // 3
+        font = FONTS.get(font_size)
         
         # Center the text
         bbox = draw.textbbox((0, 0), text, font=font)
@@ -272,83 +287,251 @@ class DemoImageGenerator:
         # Apply gaussian blur for subtlety
         txt_layer = txt_layer.filter(ImageFilter.GaussianBlur(radius=3))
         
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-        watermarked = Image.alpha_composite(img, txt_layer)
-        return watermarked.convert('RGB')
+        return composite(img, txt_layer)
     
-    def generate_demo_set(self):
-        """Generate a complete set of demo images"""
-        generated_files = []
-        
-        for i, category in enumerate(IMAGE_CATEGORIES):
+    def iter_sources(self, categories: List[str], variants, completed=frozenset(),
+                     size: Tuple[int, int] = DEFAULT_SIZE):
+        """Source stage: yield (category, base image) for categories with outstanding variants
+        
+        Every download starts up front, so later categories arrive while
+        earlier ones are rendered; the fetcher bounds how many run at once.
+        """
+        pending = {category: self.request_unsplash_image(category) for category in categories
+                   if not all((category, name) in completed for name, _, _ in variants)}
+        for category in categories:
+            if category not in pending:
+                print(f"\nSkipping {category}: already completed")
+                continue
             print(f"\nGenerating images for: {category}")
+            yield category, self.download_unsplash_image(category, size, pending.pop(category))
+    
+    def iter_variants(self, sources, variants, completed=frozenset(), fmt: str = 'jpg'):
+        """Variant stage: yield jobs for the clean base, then each outstanding watermark variant
+        
+        A job is (category, watermark type or None for clean, filename, input digest,
+        render callable), so the encode stage can skip rendering fresh outputs.
+        """
+        encoder = OUTPUT_FORMATS[fmt]
+        ext = encoder.ext
+        for category, base_img in sources:
+            prefix = category.replace(' ', '_')
+            clean_filename = f"{prefix}_clean{ext}"
+            clean_inputs = digest(BUILD_VERSION, base_img.tobytes(), base_img.size, fmt,
+                                  encoder.pil_format, encoder.save_params())
+            yield category, None, clean_filename, clean_inputs, lambda img=base_img: img
             
-            # Get base image
-            base_img = self.download_unsplash_image(category)
-            
-            # Save original (without watermark)
-            clean_filename = f"{category.replace(' ', '_')}_clean.jpg"
-            clean_path = os.path.join(OUTPUT_DIR, clean_filename)
-            base_img.save(clean_path, quality=95)
-            print(f"  ✓ Saved clean version: {clean_filename}")
-            
-            # Generate different watermark versions
-            watermark_configs = [
-                ('text_center', lambda img: self.add_text_watermark(img, 'SAMPLE', 'center', 0.5)),
-                ('text_corner', lambda img: self.add_text_watermark(img, '© DEMO 2024', 'bottom-right', 0.7)),
-                ('pattern_diagonal', lambda img: self.add_pattern_watermark(img, 'WATERMARK', 'diagonal', 0.3)),
-                ('pattern_grid', lambda img: self.add_pattern_watermark(img, 'DEMO', 'grid', 0.25)),
-                ('logo', lambda img: self.add_logo_watermark(img, 0.4)),
-                ('embedded', lambda img: self.add_embedded_watermark(img, 'PROTECTED', 0.15))
-            ]
-            
-            for watermark_type, watermark_func in watermark_configs:
-                watermarked_img = watermark_func(base_img.copy())
-                watermarked_filename = f"{category.replace(' ', '_')}_{watermark_type}.jpg"
-                watermarked_path = os.path.join(OUTPUT_DIR, watermarked_filename)
-                watermarked_img.save(watermarked_path, quality=95)
-                print(f"  ✓ Saved watermarked version: {watermarked_filename}")
-                
-                generated_files.append({
+            for watermark_type, method_name, args in variants:
+                if (category, watermark_type) in completed:
+                    continue
+                method = getattr(self, method_name)
+                inputs = digest(clean_inputs, watermark_type, args, inspect.getsource(method),
+                                file_digest(FONTS.path))
+                # The watermark methods never modify their input, so the base is shared
+                render = lambda img=base_img, m=method, a=args: m(img, *a)
+                yield category, watermark_type, f"{prefix}_{watermark_type}{ext}", inputs, render
+    
+    def encode_job(self, job, fmt: str = 'jpg'):
+        """Render and write one job unless the manifest says its output is fresh"""
+        category, watermark_type, filename, inputs, render = job
+        encoder = OUTPUT_FORMATS[fmt]
+        path = os.path.join(OUTPUT_DIR, filename)
+        label = 'Clean' if watermark_type is None else 'Watermarked'
+        if self.manifest.is_fresh(path, inputs):
+            print(f"  • {label} version up to date: {filename}")
+        else:
+            render().save(path, encoder.pil_format, **encoder.save_params())
+            self.manifest.record(path, inputs)
+            print(f"  ✓ Saved {label.lower()} version: {filename}")
+        return job
+    
+    def encode(self, jobs, fmt: str = 'jpg', workers: int = 1):
+        """Encode stage: write each job's output, yielding pair records in job order"""
+        if workers > 1:
+            pool = ThreadPoolExecutor(max_workers=workers)
+            done = bounded_map(pool, lambda job: self.encode_job(job, fmt), jobs, workers * 2)
+        else:
+            pool = None
+            done = (self.encode_job(job, fmt) for job in jobs)
+        
+        clean_filename = None
+        try:
+            for category, watermark_type, filename, _, _ in done:
+                self.manifest.save()
+                if watermark_type is None:
+                    clean_filename = filename
+                    continue
+                yield {
                     'category': category,
                     'type': watermark_type,
-                    'watermarked': watermarked_filename,
+                    'watermarked': filename,
                     'clean': clean_filename
-                })
-        
-        # Save metadata
+                }
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    
+    def sink(self, records, log_path: str):
+        """Sink stage: append each record to the JSON Lines log, flushed as it lands"""
+        with open(log_path, 'a') as log:
+            for record in records:
+                log.write(json.dumps(record) + '\n')
+                log.flush()
+                os.fsync(log.fileno())
+                yield record
+    
+    def iter_demo_set(self, categories: List[str] = IMAGE_CATEGORIES, types: List[str] = None,
+                      size: Tuple[int, int] = DEFAULT_SIZE, fmt: str = 'jpg', workers: int = 1,
+                      resume: bool = False):
+        """Stream the demo set, yielding each image pair record as soon as it is written"""
+        variants = [v for v in DEMO_VARIANTS if types is None or v[0] in types]
+        log_path = os.path.join(OUTPUT_DIR, METADATA_LOG)
+        completed = set()
+        if resume:
+            for record in read_metadata_log(log_path):
+                completed.add((record['category'], record['type']))
+        elif os.path.exists(log_path):
+            os.remove(log_path)
+        
+        sources = self.iter_sources(categories, variants, completed, size)
+        jobs = self.iter_variants(sources, variants, completed, fmt)
+        yield from self.sink(self.encode(jobs, fmt, workers), log_path)
+    
+    def generate_demo_set(self, categories: List[str] = IMAGE_CATEGORIES, types: List[str] = None,
+                          size: Tuple[int, int] = DEFAULT_SIZE, fmt: str = 'jpg', workers: int = 1,
+                          resume: bool = False) -> int:
+        """Generate a complete set of demo images; returns the number of new pairs"""
+        count = 0
+        for _ in self.iter_demo_set(categories, types, size, fmt, workers, resume):
+            count += 1
+        
+        # Compile the record log into the metadata.json summary
         metadata_path = os.path.join(OUTPUT_DIR, 'metadata.json')
         with open(metadata_path, 'w') as f:
             json.dump({
-                'generated_files': generated_files,
+                'generated_files': list(read_metadata_log(os.path.join(OUTPUT_DIR, METADATA_LOG))),
                 'watermark_types': list(WATERMARK_TYPES.keys()),
                 'categories': IMAGE_CATEGORIES
             }, f, indent=2)
         print(f"\n✓ Saved metadata to: {metadata_path}")
         
-        return generated_files
+        return count
+
+def bounded_map(pool, fn, iterable, window: int):
+    """Like pool.map, but keeps at most `window` tasks in flight so the input stays lazy"""
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def read_metadata_log(path: str):
+    """Yield the records of a JSON Lines metadata log, ignoring a torn last line"""
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def parse_size(value: str) -> Tuple[int, int]:
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value!r}")
+    return width, height
+
+def parse_list(choices):
+    def parse(value: str) -> List[str]:
+        items = [item.strip() for item in value.split(',') if item.strip()]
+        unknown = [item for item in items if item not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown: {', '.join(unknown)} (choose from {', '.join(choices)})")
+        return items
+    return parse
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Generate demo images with various watermark types')
+    commands = parser.add_subparsers(dest='command')
+    
+    commands.add_parser('list', help='list the available categories and watermark types')
+    
+    generate = commands.add_parser('generate', help='generate the demo set (default command)')
+    generate.add_argument('--categories', type=parse_list(IMAGE_CATEGORIES), default=IMAGE_CATEGORIES,
+                          help='comma-separated categories (default: all)')
+    generate.add_argument('--types', type=parse_list([v[0] for v in DEMO_VARIANTS]), default=None,
+                          help='comma-separated watermark types (default: all)')
+    generate.add_argument('--size', type=parse_size, default=DEFAULT_SIZE,
+                          help='output size as WIDTHxHEIGHT (default: 800x600)')
+    generate.add_argument('--format', choices=sorted(OUTPUT_FORMATS), default='jpg',
+                          help='output format (default: jpg)')
+    generate.add_argument('--workers', type=int, default=1, help='encoder threads (default: 1)')
+    generate.add_argument('--dry-run', action='store_true', help='list the planned outputs and exit')
+    generate.add_argument('--resume', action='store_true',
+                          help='continue from the records in metadata.jsonl')
+    generate.add_argument('--force', action='store_true',
+                          help='rebuild every output even if its inputs are unchanged')
+    generate.add_argument('--offline', action='store_true', help='use only the download cache')
+    generate.add_argument('--download-workers', type=int, default=4,
+                          help='concurrent downloads (default: 4)')
+    generate.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                          help=f'base seed for placeholder images; same seed, same bytes (default: {DEFAULT_SEED})')
+    return parser
 
-def main():
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ('list', 'generate', '-h', '--help'):
+        argv = ['generate'] + list(argv)
+    args = build_parser().parse_args(argv)
+    
+    if args.command == 'list':
+        print("Categories:")
+        for category in IMAGE_CATEGORIES:
+            print(f"  • {category}")
+        print("Watermark types:")
+        for name, _, _ in DEMO_VARIANTS:
+            print(f"  • {name}")
+        return
+    
+    types = args.types or [v[0] for v in DEMO_VARIANTS]
+    if args.dry_run:
+        ext = OUTPUT_FORMATS[args.format].ext
+        for category in args.categories:
+            prefix = category.replace(' ', '_')
+            print(os.path.join(OUTPUT_DIR, f"{prefix}_clean{ext}"))
+            for name in types:
+                print(os.path.join(OUTPUT_DIR, f"{prefix}_{name}{ext}"))
+        print(f"{len(args.categories)} categories × {len(types)} types at "
+              f"{args.size[0]}x{args.size[1]} ({args.format})")
+        return
+    
     print("=" * 50)
     print("Demo Image Generator with Watermarks")
     print("=" * 50)
     
-    generator = DemoImageGenerator()
+    cache = DownloadCache(offline=args.offline)
+    generator = DemoImageGenerator(cache=cache, force=args.force, seed=args.seed,
+                                   fetcher=Fetcher(cache, concurrency=max(1, args.download_workers)))
     
-    print("\nThis script will generate demo images with various watermark types.")
     print("Images will be saved to:", OUTPUT_DIR)
     print("\nWatermark types to be generated:")
-    for wm_type in WATERMARK_TYPES:
+    for wm_type in types:
         print(f"  • {wm_type}")
     
-    input("\nPress Enter to start generation...")
-    
-    generated = generator.generate_demo_set()
+    try:
+        generated = generator.generate_demo_set(args.categories, types, args.size, args.format,
+                                                args.workers, args.resume)
+    finally:
+        generator.fetcher.close()
     
     print("\n" + "=" * 50)
-    print(f"✓ Successfully generated {len(generated)} image pairs!")
+    print(f"✓ Successfully generated {generated} image pairs!")
     print(f"✓ Images saved to: {OUTPUT_DIR}")
+    if FONTS.fallbacks:
+        print(f"⚠ {FONTS.fallbacks} text elements used the default font")
     print("=" * 50)
 
 if __name__ == "__main__":
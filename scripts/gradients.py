@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Gradient fills for the synthetic demo images
+Linear, diagonal and radial gradients with any number of color stops,
+computed as NumPy arrays instead of one draw call per row; 2-D gradients are
+evaluated in row tiles so scratch memory stays small at 4K. uint8 output
+truncates like int(); float32 output keeps the unrounded values for later
+noise and lighting steps
+"""
+
+import math
+from typing import Callable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+Color = Tuple[int, int, int]
+# Bare colors are spread evenly over 0..1; (position, color) pairs place them
+# explicitly, and two stops at one position make a hard edge
+Stops = Sequence[Union[Color, Tuple[float, Color]]]
+Span = Tuple[float, float]
+# Rows per tile for full-frame passes: a few MB of float64 scratch at 4K
+TILE_ROWS = 128
+
+
+def _parse_stops(stops: Stops, work) -> Tuple[np.ndarray, np.ndarray]:
+    if len(stops) < 2:
+        raise ValueError("a gradient needs at least two stops")
+    if all(len(stop) == 2 for stop in stops):
+        positions = [float(position) for position, _ in stops]
+        colors = [color for _, color in stops]
+    else:
+        positions = [i / (len(stops) - 1) for i in range(len(stops))]
+        colors = stops
+    if any(b < a for a, b in zip(positions, positions[1:])) or positions[-1] <= positions[0]:
+        raise ValueError("stop positions must increase from the first stop to the last")
+    return np.array(positions, dtype=work), np.array(colors, dtype=work)
+
+
+def ramp(t: np.ndarray, stops: Stops, span: Span = (0.0, 1.0), dtype=np.uint8) -> np.ndarray:
+    """Colors for an array of positions, shaped t.shape + (3,).
+
+    `span` picks the part of the stop range that t's 0..1 covers, so (0.2, 1)
+    starts the gradient a fifth of the way in. Positions outside the stops
+    take the end colors.
+    """
+    work = np.float32 if np.dtype(dtype) == np.float32 else np.float64
+    positions, colors = _parse_stops(stops, work)
+    t = np.asarray(t, dtype=work)
+    if span != (0.0, 1.0):
+        t = t * work(span[1] - span[0]) + work(span[0])
+    if len(positions) == 2:
+        # One segment: no per-pixel lookup
+        start, length = positions[0], positions[1] - positions[0]
+        first, last = colors[0], colors[1]
+    else:
+        # Last stop at or before t, so a hard edge belongs to the segment after it
+        segment = np.clip(np.searchsorted(positions, t, side='right') - 1, 0, len(positions) - 2)
+        start = positions[segment]
+        length = positions[segment + 1] - start
+        # Only a hard edge at the very end can land t in an empty segment
+        length = np.where(length > 0, length, 1)
+        first, last = colors[segment], colors[segment + 1]
+    ratio = np.clip((t - start) / length, 0, 1)[..., None]
+    return (first * (1 - ratio) + last * ratio).astype(dtype)
+
+
+def _fill(size: Tuple[int, int], colors: np.ndarray) -> np.ndarray:
+    """Broadcast a row or column of colors to a full, writable frame"""
+    width, height = size
+    out = np.empty((height, width, 3), dtype=colors.dtype)
+    out[...] = colors
+    return out
+
+
+def _tiled(size: Tuple[int, int], positions: Callable[[int, int], np.ndarray], stops: Stops,
+           span: Span, dtype) -> np.ndarray:
+    """Fill a frame from `positions(top, bottom)`, the gradient position of each pixel in those rows"""
+    width, height = size
+    out = np.empty((height, width, 3), dtype=dtype)
+    for top in range(0, height, TILE_ROWS):
+        bottom = min(top + TILE_ROWS, height)
+        out[top:bottom] = ramp(positions(top, bottom), stops, span, dtype)
+    return out
+
+
+def linear(size: Tuple[int, int], stops: Stops, angle: float = 90.0, span: Span = (0.0, 1.0),
+           dtype=np.uint8) -> np.ndarray:
+    """Gradient along `angle` degrees: 0 runs left to right, 90 top to bottom.
+
+    Axis-aligned gradients evaluate one row or column and broadcast it.
+    """
+    width, height = size
+    angle %= 360
+    if angle in (0, 90, 180, 270):
+        extent = width if angle in (0, 180) else height
+        t = np.arange(extent, dtype=np.float64) / extent
+        if angle >= 180:
+            t = 1 - t
+        colors = ramp(t, stops, span, dtype)
+        return _fill(size, colors[None, :] if angle in (0, 180) else colors[:, None])
+    cos, sin = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    corners = [0.0, width * cos, height * sin, width * cos + height * sin]
+    low, high = min(corners), max(corners)
+    xs = np.arange(width, dtype=np.float64)[None, :] * cos
+
+    def positions(top, bottom):
+        ys = np.arange(top, bottom, dtype=np.float64)[:, None] * sin
+        return (xs + ys - low) / (high - low)
+    return _tiled(size, positions, stops, span, dtype)
+
+
+def diagonal(size: Tuple[int, int], stops: Stops, span: Span = (0.0, 1.0), dtype=np.uint8) -> np.ndarray:
+    """Gradient from the top-left corner to the bottom-right corner, whatever the aspect ratio"""
+    width, height = size
+    xs = np.arange(width, dtype=np.float64)[None, :] / width
+
+    def positions(top, bottom):
+        ys = np.arange(top, bottom, dtype=np.float64)[:, None] / height
+        return (xs + ys) / 2
+    return _tiled(size, positions, stops, span, dtype)
+
+
+def radial(size: Tuple[int, int], stops: Stops, center: Optional[Tuple[float, float]] = None,
+           radius: Optional[float] = None, span: Span = (0.0, 1.0), dtype=np.uint8) -> np.ndarray:
+    """Gradient outward from `center` (default: frame center), reaching the last stop at `radius`"""
+    width, height = size
+    cx, cy = center if center is not None else (width / 2, height / 2)
+    radius = radius if radius is not None else min(size) / 2
+    xs = (np.arange(width, dtype=np.float64)[None, :] - cx) ** 2
+
+    def positions(top, bottom):
+        ys = (np.arange(top, bottom, dtype=np.float64)[:, None] - cy) ** 2
+        return np.minimum(np.sqrt(xs + ys) / radius, 1.0)
+    return _tiled(size, positions, stops, span, dtype)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Large-image mode for the watermark scripts
+Sources well above the output size are reduced while decoding (JPEG draft
+scaling, otherwise an integer reduce() straight after decode). Frames above
+LARGE_IMAGE_PIXELS render and composite overlays a strip of rows at a time
+"""
+
+import math
+import os
+from typing import Tuple
+
+from PIL import Image
+
+# Frames at or above this many pixels are composited in strips
+LARGE_IMAGE_PIXELS = int(os.getenv('DEMO_LARGE_IMAGE_PIXELS', str(24_000_000)))
+# Rows per strip: about 9 MB of RGBA at 8K width
+STRIP_ROWS = 256
+# Keep at least this much oversampling for the final LANCZOS resize, like Image.thumbnail's reducing_gap
+REDUCING_GAP = 2.0
+
+
+def is_large(size: Tuple[int, int]) -> bool:
+    return size[0] * size[1] >= LARGE_IMAGE_PIXELS
+
+
+def decode(img: Image.Image, min_size: Tuple[int, int]) -> Image.Image:
+    """Decode a freshly opened image to RGB, reduced on decode while it stays REDUCING_GAP × `min_size`.
+
+    JPEG decodes straight to 1/2, 1/4 or 1/8 scale through draft(); other
+    formats decode fully and are reduce()d by an integer factor before any
+    further work. Images that are not large enough to bother come back at
+    full size.
+    """
+    need = (math.ceil(min_size[0] * REDUCING_GAP), math.ceil(min_size[1] * REDUCING_GAP))
+    if img.format == 'JPEG' and img.width >= 2 * need[0] and img.height >= 2 * need[1]:
+        img.draft('RGB', need)
+    img = img.convert('RGB')
+    factor = min(img.width // need[0], img.height // need[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img
+
+
+def cover_size(size: Tuple[int, int], target: Tuple[int, int]) -> Tuple[int, int]:
+    """Smallest scaled `size` whose centre crop to `target`'s aspect ratio still covers `target`"""
+    scale = max(target[0] / size[0], target[1] / size[1])
+    return math.ceil(size[0] * scale), math.ceil(size[1] * scale)
+
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Declarative watermark recipes
+A recipe is a JSON document (or YAML, with PyYAML installed) listing
+variants: the base each starts from, the layers put on it and the files it
+writes. One engine interprets every recipe, so a build can be planned up
+front and fonts, sprites and bases are shared across all of its variants
+"""
+
+import json
+import os
+from collections import OrderedDict
+from typing import Callable, Collection, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from compositing import Overlay, composite
+from sprite_cache import SPRITES
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+RECIPE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recipes')
+# Every layer canvas starts fully transparent white, like the hand-written layers did
+CANVAS_COLOR = (255, 255, 255, 0)
+
+LAYER_TYPES = ('overlay', 'stamp', 'style')
+OPS = ('text', 'rectangle', 'ellipse', 'polygon', 'text_grid', 'sprite_grid')
+CORNERS = ('top-left', 'top-right', 'bottom-left', 'bottom-right')
+
+
+def recipe_path(name: str) -> str:
+    """Bundled recipe by name, e.g. recipe_path('new_watermark_demo')"""
+    return os.path.join(RECIPE_DIR, f"{name}.json")
+
+
+def load_recipe(path: str, bases: Optional[Collection[str]] = None, outputs: Collection[str] = ()) -> dict:
+    """Read and validate a .json, .yaml or .yml recipe (see validate() for `bases` and `outputs`)"""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError(f"{path}: YAML recipes need PyYAML (pip install pyyaml)")
+            recipe = yaml.safe_load(f)
+        else:
+            recipe = json.load(f)
+    validate(recipe, path, bases, outputs)
+    return recipe
+
+
+def validate(recipe: dict, source: str = 'recipe', bases: Optional[Collection[str]] = None,
+             outputs: Collection[str] = ()):
+    """Raise ValueError naming the first malformed variant, layer or op.
+
+    Consumers that render and write every variant pass the base categories
+    they can render and the output roles each variant must name.
+    """
+    variants = recipe.get('variants')
+    if not isinstance(variants, list) or not variants:
+        raise ValueError(f"{source}: 'variants' must be a non-empty list")
+    seen = set()
+    for variant in variants:
+        name = variant.get('name')
+        if not name or name in seen:
+            raise ValueError(f"{source}: every variant needs a unique name (got {name!r})")
+        seen.add(name)
+        if bases is not None and variant.get('base') not in bases:
+            raise ValueError(f"{source}: {name}: 'base' must be one of {', '.join(bases)} "
+                             f"(got {variant.get('base')!r})")
+        missing = [role for role in outputs if not (variant.get('outputs') or {}).get(role)]
+        if missing:
+            raise ValueError(f"{source}: {name}: 'outputs' needs a file for {', '.join(missing)}")
+        for layer in variant.get('layers', []):
+            kind = layer.get('type')
+            if kind not in LAYER_TYPES:
+                raise ValueError(f"{source}: {name}: unknown layer type {kind!r} "
+                                 f"(choose from {', '.join(LAYER_TYPES)})")
+            if kind == 'style' and not layer.get('style'):
+                raise ValueError(f"{source}: {name}: style layers need a 'style'")
+            if kind == 'stamp' and len(layer.get('size', ())) != 2:
+                raise ValueError(f"{source}: {name}: stamp layers need a [width, height] 'size'")
+            for op in layer.get('ops', []):
+                if op.get('op') not in OPS:
+                    raise ValueError(f"{source}: {name}: unknown op {op.get('op')!r} "
+                                     f"(choose from {', '.join(OPS)})")
+                position = op.get('position', layer.get('position'))
+                if position not in (None, 'center') + CORNERS:
+                    raise ValueError(f"{source}: {name}: unknown position {position!r}")
+
+
+def plan(recipe: dict, groups: Optional[List[str]] = None) -> Dict[str, List[dict]]:
+    """Variants by group, in recipe order, optionally limited to some groups"""
+    planned = OrderedDict()
+    for variant in recipe['variants']:
+        group = variant.get('group', 'default')
+        if groups is None or group in groups:
+            planned.setdefault(group, []).append(variant)
+    return planned
+
+
+def style_variants(recipe: dict) -> List[Tuple[str, str, tuple]]:
+    """(name, style, args) for recipes whose variants are one style layer each"""
+    table = []
+    for variant in recipe['variants']:
+        layer, = variant['layers']
+        table.append((variant['name'], layer['style'], tuple(layer.get('args', ()))))
+    return table
+
+
+def _margin(margin, size: Tuple[int, int]) -> Tuple[int, int]:
+    """A scalar margin is that fraction of the width on both axes; a pair is [width, height] fractions"""
+    if isinstance(margin, (list, tuple)):
+        return int(size[0] * margin[0]), int(size[1] * margin[1])
+    return int(size[0] * margin), int(size[0] * margin)
+
+
+def place(spec: dict, box: Tuple[int, int], size: Tuple[int, int],
+          previous: Optional[Tuple[int, int, int, int]] = None) -> Tuple[int, int]:
+    """Top-left corner of a `box`-sized item on a `size`-sized canvas.
+
+    `at` centers the item on a point given as canvas fractions; otherwise
+    `position` is center or a corner inset by `margin`. `below` puts the
+    item that many pixels under the previous one, and `offset` shifts it.
+    """
+    width, height = box
+    if 'at' in spec:
+        x = int(size[0] * spec['at'][0]) - width // 2
+        y = int(size[1] * spec['at'][1]) - height // 2
+    elif spec.get('position', 'center') == 'center':
+        x = (size[0] - width) // 2
+        y = (size[1] - height) // 2
+    else:
+        vertical, horizontal = spec['position'].split('-')
+        margin_x, margin_y = _margin(spec.get('margin', 0), size)
+        x = margin_x if horizontal == 'left' else size[0] - width - margin_x
+        y = margin_y if vertical == 'top' else size[1] - height - margin_y
+    if 'below' in spec and previous is not None:
+        y = previous[1] + previous[3] + spec['below']
+    dx, dy = spec.get('offset', (0, 0))
+    return x + dx, y + dy
+
+
+def _paint(op: dict) -> dict:
+    """fill/outline/width keyword arguments of an op, as ImageDraw wants them"""
+    return {key: tuple(op[key]) if isinstance(op[key], list) else op[key]
+            for key in ('fill', 'outline', 'width') if key in op}
+
+
+class _Canvas:
+    """An Overlay plus what the ops on it need: fonts, the last placed box and a mark count"""
+
+    def __init__(self, size: Tuple[int, int], fonts):
+        self.size = size
+        self.draw = Overlay(size, CANVAS_COLOR)
+        self.fonts = fonts
+        self.previous = None
+        self.placed = 0
+
+    def font(self, op: dict, text: str):
+        font = self.fonts.get(op['size'])
+        if 'fallback_size' in op and not self._measurable(text, font):
+            font = self.fonts.get(op['fallback_size'])
+        return font
+
+    def _measurable(self, text, font) -> bool:
+        try:
+            bbox = self.draw.textbbox((0, 0), text, font=font)
+        except Exception:
+            return False
+        return bbox[2] - bbox[0] > 0 and bbox[3] - bbox[1] > 0
+
+    def measure(self, text, font) -> Tuple[int, int]:
+        bbox = self.draw.textbbox((0, 0), text, font=font)
+        return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+def _op_text(canvas: _Canvas, op: dict):
+    text = op['text']
+    font = canvas.font(op, text)
+    width, height = canvas.measure(text, font)
+    x, y = place(op, (width, height), canvas.size, canvas.previous)
+    if 'background' in op:
+        pad = op['background'].get('padding', 0)
+        canvas.draw.rectangle([x - pad, y - pad, x + width + pad, y + height + pad],
+                              **_paint(op['background']))
+    if 'shadow' in op:
+        dx, dy = op['shadow'].get('offset', (2, 2))
+        canvas.draw.text((x + dx, y + dy), text, font=font, **_paint(op['shadow']))
+    canvas.draw.text((x, y), text, font=font, **_paint(op))
+    canvas.previous = (x, y, width, height)
+
+
+def _op_rectangle(canvas: _Canvas, op: dict):
+    if op.get('box') == 'frame':
+        box = [0, 0, canvas.size[0], canvas.size[1]]
+    else:
+        width, height = op['size']
+        x, y = place(op, (width, height), canvas.size, canvas.previous)
+        box = [x, y, x + width, y + height]
+    canvas.draw.rectangle(box, **_paint(op))
+
+
+def _op_ellipse(canvas: _Canvas, op: dict):
+    radius = op['radius']
+    fx, fy = op.get('at', (0.5, 0.5))
+    cx, cy = int(canvas.size[0] * fx), int(canvas.size[1] * fy)
+    canvas.draw.ellipse([cx - radius, cy - radius, cx + radius, cy + radius], **_paint(op))
+
+
+def _op_polygon(canvas: _Canvas, op: dict):
+    canvas.draw.polygon([tuple(point) for point in op['points']], **_paint(op))
+
+
+def _op_text_grid(canvas: _Canvas, op: dict):
+    """Text repeated on a grid spaced by its own size plus `gap`, every other row shifted half a cell"""
+    text = op['text']
+    font = canvas.font(op, text)
+    width, height = canvas.measure(text, font)
+    gap_x, gap_y = op.get('gap', (0, 0))
+    offset_x, offset_y = op.get('offset', (0, 0))
+    step_x, step_y = width + gap_x, height + gap_y
+    canvas_w, canvas_h = canvas.size
+    for row in range(max(1, canvas_h // step_y)):
+        shift = (row % 2) * (step_x // 2) if op.get('stagger') else 0
+        for col in range(max(1, canvas_w // step_x)):
+            x = col * step_x + shift + offset_x
+            y = row * step_y + offset_y
+            if x >= 0 and y >= 0 and x + width <= canvas_w and y + height <= canvas_h:
+                canvas.draw.text((x, y), text, font=font, **_paint(op))
+                canvas.placed += 1
+
+
+def _op_sprite_grid(canvas: _Canvas, op: dict):
+    """Rotated text sprites on a sheared grid, each pasted inside the frame"""
+    text = op['text']
+    font = canvas.font(op, text)
+    width, height = canvas.measure(text, font)
+    step_x, step_y = op['step']
+    shear = op.get('shear', 0)
+    offset_x, offset_y = op.get('offset', (0, 0))
+    slack_x, slack_y = op.get('slack', (0, 0))
+    pad = op.get('pad', 0)
+    canvas_w, canvas_h = canvas.size
+    for row in range(*op['rows']):
+        for col in range(*op['cols']):
+            x = col * step_x + row * shear + offset_x
+            y = row * step_y + offset_y
+            if not (x >= -slack_x and y >= -slack_y and
+                    x + width <= canvas_w + slack_x and y + height <= canvas_h + slack_y):
+                continue
+            # Rendered and rotated once, shared by every position and variant
+            sprite = SPRITES.get(text, font, _paint(op)['fill'], op.get('angle', 0),
+                                 canvas=(width + 2 * pad, height + 2 * pad), origin=(pad, pad))
+            paste_x = max(0, min(x, canvas_w - sprite.width))
+            paste_y = max(0, min(y, canvas_h - sprite.height))
+            canvas.draw.paste(sprite, (paste_x, paste_y), sprite)
+            canvas.placed += 1
+
+
+OP_FN: Dict[str, Callable[[_Canvas, dict], None]] = {
+    'text': _op_text,
+    'rectangle': _op_rectangle,
+    'ellipse': _op_ellipse,
+    'polygon': _op_polygon,
+    'text_grid': _op_text_grid,
+    'sprite_grid': _op_sprite_grid,
+}
+
+
+def _draw(size: Tuple[int, int], ops: List[dict], fonts) -> _Canvas:
+    canvas = _Canvas(size, fonts)
+    for op in ops:
+        OP_FN[op['op']](canvas, op)
+    return canvas
+
+
+def render(img: Image.Image, variant: dict, fonts,
+           styles: Optional[Dict[str, Callable]] = None) -> Tuple[Image.Image, int]:
+    """Apply a variant's layers to `img`; returns a new image and how many grid marks were placed.
+
+    overlay layers draw on a frame-sized canvas that is alpha-composited;
+    stamp layers draw on their own canvas, placed like a text op and either
+    composited or pasted with their alpha as the mask (blend: paste); style
+    layers call `styles[style](img, *args)`.
+    """
+    out, owned, placed = img, False, 0
+    for layer in variant.get('layers', []):
+        kind = layer['type']
+        if kind == 'style':
+            out, owned = styles[layer['style']](out, *layer.get('args', ())), True
+            continue
+        size = out.size if kind == 'overlay' else tuple(layer['size'])
+        canvas = _draw(size, layer.get('ops', []), fonts)
+        placed += canvas.placed
+        if kind == 'overlay':
+            out, owned = composite(out, canvas.draw), True
+            continue
+        rendered = canvas.draw.render()
+        if rendered is None:
+            continue
+        stamp, (dx, dy) = rendered
+        x, y = place(layer, size, out.size)
+        x, y = max(0, x) + dx, max(0, y) + dy
+        if layer.get('blend') == 'paste':
+            # A masked paste blends the RGB channels directly; no RGBA round trip needed
+            if not owned:
+                out, owned = out.copy(), True
+            out.paste(stamp, (x, y), stamp)
+        else:
+            out, owned = composite(out, (stamp, (x, y))), True
+    return (out if owned else out.copy()), placed
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Rotated text sprite cache for pattern watermarks
+Renders a text sprite and rotates it once per (text, font, fill, angle,
+canvas) and hands the same image back for every paste, across all images in
+a batch
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+DEFAULT_MAX_SPRITES = 256
+
+
+def font_key(font):
+    """Identify a font by file and size when possible so equal fonts share sprites"""
+    path = getattr(font, 'path', None)
+    if path:
+        return (str(path), getattr(font, 'size', None), getattr(font, 'index', 0))
+    return ('object', id(font))
+
+
+class SpriteCache:
+    def __init__(self, maxsize: int = DEFAULT_MAX_SPRITES):
+        self.maxsize = maxsize
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str, font, fill, angle: float,
+            canvas: Optional[Tuple[int, int]] = None, origin: Tuple[int, int] = (0, 0)) -> Image.Image:
+        """Sprite of `text` drawn at `origin` on a transparent `canvas`, rotated by `angle` with expand.
+
+        Without a canvas the text's own bounding box plus `origin` on each side is used.
+        """
+        key = (text, font_key(font), tuple(fill), angle, canvas, origin)
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                self.hits += 1
+                return sprite
+            self.misses += 1
+        if canvas is None:
+            bbox = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+            canvas = (bbox[2] - bbox[0] + 2 * origin[0], bbox[3] - bbox[1] + 2 * origin[1])
+        temp_img = Image.new('RGBA', canvas, (255, 255, 255, 0))
+        ImageDraw.Draw(temp_img).text(origin, text, fill=tuple(fill), font=font)
+        sprite = temp_img.rotate(angle, expand=True) if angle else temp_img
+        with self._lock:
+            self._sprites[key] = sprite
+            while len(self._sprites) > self.maxsize:
+                self._sprites.popitem(last=False)
+        return sprite
+
+
+# Shared by every generator in the process so a batch rotates each sprite once
+SPRITES = SpriteCache()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Per-stage profiling hooks for the demo generators
+Times named pipeline stages (download, fit, enhance, overlay, composite,
+encode…) per asset, optionally with cProfile and tracemalloc capture, and
+reports a summary table, JSON or a Chrome trace. Disabled by default; a
+disabled stage() hands back one shared no-op context manager
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+_NULL = contextlib.nullcontext()
+
+
+class _Frame:
+    __slots__ = ('name', 'asset', 'start', 'child', 'mem_start', 'mem_peak', 'profile')
+
+    def __init__(self, name, asset):
+        self.name = name
+        self.asset = asset
+        self.child = 0.0
+        self.mem_start = self.mem_peak = 0
+        self.profile = None
+
+
+class _RawStats:
+    """Wraps a cProfile stats dict so pstats.Stats can load it"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class StageProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.cprofile = False
+        self.memory = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.spans = []
+        self.profiles = defaultdict(list)
+
+    def enable(self, cprofile: bool = False, memory: bool = False):
+        self.cprofile = cprofile
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def options(self) -> Optional[dict]:
+        """Settings to hand to worker processes, or None when disabled"""
+        if not self.enabled:
+            return None
+        return {'cprofile': self.cprofile, 'memory': self.memory}
+
+    def init_worker(self, options: Optional[dict]):
+        """Process pool initializer: match the parent's settings in a freshly started worker"""
+        if options is not None:
+            self.enable(**options)
+
+    def stage(self, name: str, asset: Optional[str] = None):
+        """Context manager timing one stage; nested stages inherit the asset"""
+        if not self.enabled:
+            return _NULL
+        return self._stage(name, asset)
+
+    @contextlib.contextmanager
+    def _stage(self, name, asset):
+        stack = self._local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        frame = _Frame(name, asset if asset is not None else (parent.asset if parent else None))
+        if self.memory:
+            # tracemalloc keeps one process-wide peak: fold it into the parent before resetting
+            frame.mem_start, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent.mem_peak = max(parent.mem_peak, peak)
+            tracemalloc.reset_peak()
+        if self.cprofile and not any(f.profile for f in stack):
+            try:
+                frame.profile = cProfile.Profile()
+                frame.profile.enable()
+            except ValueError:
+                # Another thread's stage is already being profiled
+                frame.profile = None
+        stack.append(frame)
+        frame.start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            duration = end - frame.start
+            span = {
+                'name': name,
+                'asset': frame.asset,
+                'start': frame.start,
+                'duration': duration,
+                'self': duration - frame.child,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'depth': len(stack),
+            }
+            if frame.profile is not None:
+                frame.profile.disable()
+                frame.profile.create_stats()
+            if self.memory:
+                frame.mem_peak = max(frame.mem_peak, tracemalloc.get_traced_memory()[1])
+                span['alloc_peak'] = max(0, frame.mem_peak - frame.mem_start)
+                if parent is not None:
+                    parent.mem_peak = max(parent.mem_peak, frame.mem_peak)
+            if parent is not None:
+                parent.child += duration
+            with self._lock:
+                self.spans.append(span)
+                if frame.profile is not None:
+                    self.profiles[name].append(frame.profile.stats)
+
+    def drain(self) -> dict:
+        """Hand over and forget everything recorded so far (for returning from workers)"""
+        with self._lock:
+            data = {'spans': self.spans, 'profiles': dict(self.profiles)}
+            self.spans = []
+            self.profiles = defaultdict(list)
+        return data
+
+    def merge(self, data: dict):
+        """Add spans and profiles drained from another process"""
+        with self._lock:
+            self.spans.extend(data['spans'])
+            for name, stats in data['profiles'].items():
+                self.profiles[name].extend(stats)
+
+    def summary(self) -> List[dict]:
+        """Per-stage totals, in order of first appearance"""
+        rows: Dict[str, dict] = {}
+        for span in sorted(self.spans, key=lambda s: s['start']):
+            row = rows.setdefault(span['name'], {
+                'stage': span['name'], 'count': 0, 'total': 0.0, 'self': 0.0, 'max': 0.0,
+                'alloc_peak': None,
+            })
+            row['count'] += 1
+            row['total'] += span['duration']
+            row['self'] += span['self']
+            row['max'] = max(row['max'], span['duration'])
+            if 'alloc_peak' in span:
+                row['alloc_peak'] = max(row['alloc_peak'] or 0, span['alloc_peak'])
+        return list(rows.values())
+
+    def print_summary(self):
+        rows = self.summary()
+        if not rows:
+            print("\nProfile: no stages recorded")
+            return
+        # Self times add up to the profiled wall time without double counting nested stages
+        total_self = sum(row['self'] for row in rows) or 1.0
+        print("\n=== Stage Profile ===")
+        print(f"{'stage':28s} {'count':>6s} {'total ms':>10s} {'self ms':>10s} "
+              f"{'mean ms':>9s} {'max ms':>9s} {'self %':>7s} {'alloc MB':>9s}")
+        for row in rows:
+            alloc = '' if row['alloc_peak'] is None else f"{row['alloc_peak'] / 2**20:9.1f}"
+            print(f"{row['stage']:28s} {row['count']:6d} {row['total'] * 1000:10.1f} "
+                  f"{row['self'] * 1000:10.1f} {row['total'] / row['count'] * 1000:9.1f} "
+                  f"{row['max'] * 1000:9.1f} {row['self'] / total_self:7.1%} {alloc:>9s}")
+
+    def write_json(self, path: str):
+        _ensure_parent(path)
+        with open(path, 'w') as f:
+            json.dump({'spans': self.spans, 'summary': self.summary()}, f, indent=2)
+        print(f"✓ Saved stage profile to: {path}")
+
+    def write_trace(self, path: str):
+        """Chrome trace event file, for chrome://tracing or Perfetto"""
+        origin = min((s['start'] for s in self.spans), default=0.0)
+        events = [{
+            'name': span['name'],
+            'cat': 'stage',
+            'ph': 'X',
+            'ts': (span['start'] - origin) * 1e6,
+            'dur': span['duration'] * 1e6,
+            'pid': span['pid'],
+            'tid': span['tid'],
+            'args': {k: span[k] for k in ('asset', 'alloc_peak') if span.get(k) is not None},
+        } for span in self.spans]
+        _ensure_parent(path)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        print(f"✓ Saved Chrome trace to: {path}")
+
+    def write_cprofile(self, directory: str):
+        """One <stage>.prof per stage, readable with `python -m pstats`"""
+        os.makedirs(directory, exist_ok=True)
+        for name, captured in self.profiles.items():
+            stats = pstats.Stats(_RawStats(captured[0]))
+            for extra in captured[1:]:
+                stats.add(_RawStats(extra))
+            stats.dump_stats(os.path.join(directory, f"{name}.prof"))
+        print(f"✓ Saved {len(self.profiles)} cProfile dumps to: {directory}")
+
+
+def _ensure_parent(path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+
+def add_arguments(parser):
+    """The shared --profile* options; any of them turns profiling on"""
+    group = parser.add_argument_group('profiling')
+    group.add_argument('--profile', action='store_true',
+                       help='time each pipeline stage and print a summary table')
+    group.add_argument('--profile-json', metavar='PATH', help='write stage timings as JSON')
+    group.add_argument('--profile-trace', metavar='PATH',
+                       help='write a Chrome trace (chrome://tracing, Perfetto)')
+    group.add_argument('--profile-cprofile', metavar='DIR',
+                       help='capture cProfile per outermost stage into DIR/<stage>.prof')
+    group.add_argument('--profile-memory', action='store_true',
+                       help='record the tracemalloc peak of each stage')
+
+
+def configure(args) -> bool:
+    """Enable PROFILER from parsed arguments; returns whether profiling is on"""
+    if not (args.profile or args.profile_json or args.profile_trace
+            or args.profile_cprofile or args.profile_memory):
+        return False
+    PROFILER.enable(cprofile=bool(args.profile_cprofile), memory=args.profile_memory)
+    return True
+
+
+def report(args):
+    """Print and export whatever configure() asked for"""
+    if not PROFILER.enabled:
+        return
+    PROFILER.print_summary()
+    if args.profile_json:
+        PROFILER.write_json(args.profile_json)
+    if args.profile_trace:
+        PROFILER.write_trace(args.profile_trace)
+    if args.profile_cprofile:
+        PROFILER.write_cprofile(args.profile_cprofile)
+
+
+# Shared by every module in the process so nested stages line up
+PROFILER = StageProfiler()
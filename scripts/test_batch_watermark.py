@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for the batch corpus builder's input handling and output layout
+Run with: python -m pytest scripts/test_batch_watermark.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+import batch_watermark
+
+
+class FileListTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.lists = os.path.join(self.root, 'lists')
+        self.images = os.path.join(self.root, 'imgs')
+        self.output = os.path.join(self.root, 'out')
+        os.makedirs(os.path.join(self.lists, 'inside'))
+        os.makedirs(self.images)
+        for path in (os.path.join(self.images, 'a.jpg'), os.path.join(self.lists, 'inside', 'a.jpg')):
+            Image.new('RGB', (64, 48), (90, 120, 150)).save(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_list(self, entries):
+        file_list = os.path.join(self.lists, 'files.txt')
+        with open(file_list, 'w') as f:
+            f.write('\n'.join(entries) + '\n')
+        batch_watermark.main(['--file-list', file_list, '--output', self.output,
+                              '--styles', 'logo_full', '--workers', '1'])
+
+    def written(self):
+        return sorted(os.path.relpath(os.path.join(d, n), self.output)
+                      for d, _, names in os.walk(self.output) for n in names)
+
+    def test_entries_outside_the_list_directory_stay_in_the_output_tree(self):
+        absolute = os.path.join(self.images, 'a.jpg')
+        self.run_list([absolute, '../imgs/a.jpg', 'inside/a.jpg'])
+        written = self.written()
+        # Both spellings of the outside image map to one name; the inside one keeps its path
+        external = os.path.basename(batch_watermark.list_relpath(absolute, self.lists))
+        self.assertEqual(written, sorted([
+            os.path.join('clean', '_external', external),
+            os.path.join('clean', 'inside', 'a.jpg'),
+            os.path.join('logo_full', '_external', external),
+            os.path.join('logo_full', 'inside', 'a.jpg'),
+        ]))
+        self.assertEqual(sorted(os.listdir(self.root)), ['imgs', 'lists', 'out'])
+        self.assertEqual(os.listdir(self.images), ['a.jpg'])
+
+    def test_output_path_rejects_escaping_paths(self):
+        for rel in ('../a.jpg', os.path.abspath('a.jpg'), 'x/../../a.jpg'):
+            with self.assertRaises(ValueError):
+                batch_watermark.output_path(self.output, 'clean', rel, 'same')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for overlay compositing: stamped cells must match drawing every cell
+Run with: python -m pytest scripts/test_compositing.py
+"""
+
+import os
+import unittest
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from compositing import Overlay, composite
+
+FONT_PATH = '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'
+
+
+def load_font(size):
+    if os.path.exists(FONT_PATH):
+        return ImageFont.truetype(FONT_PATH, size)
+    return ImageFont.load_default(size)
+
+
+class StampTest(unittest.TestCase):
+    size = (360, 240)
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.img = Image.fromarray(rng.integers(0, 255, (self.size[1], self.size[0], 3), dtype=np.uint8))
+
+    def reference(self, draw_background, draw_cell, cells):
+        """Every mark drawn on one full-frame overlay, then alpha-composited: the pre-stamp result"""
+        overlay = Image.new('RGBA', self.size, (0, 0, 0, 0))
+        d = ImageDraw.Draw(overlay)
+        draw_background(d)
+        for x, y in cells:
+            draw_cell(d, x, y)
+        return Image.alpha_composite(self.img.convert('RGBA'), overlay).convert('RGB')
+
+    def stamped(self, draw_background, draw_cell, cells):
+        overlay = Overlay(self.size)
+        draw_background(overlay)
+        stamp = overlay.make_stamp(draw_cell)
+        drawn = 0
+        for x, y in cells:
+            if not overlay.stamp(stamp, (x, y)):
+                draw_cell(overlay, x, y)
+                drawn += 1
+        return composite(self.img, overlay), drawn
+
+    def check(self, draw_background, draw_cell, cells):
+        expected = self.reference(draw_background, draw_cell, cells)
+        actual, drawn = self.stamped(draw_background, draw_cell, cells)
+        np.testing.assert_array_equal(np.asarray(actual), np.asarray(expected))
+        return drawn
+
+    @staticmethod
+    def label_cell(font):
+        def draw_cell(d, x, y):
+            d.ellipse([x - 14, y - 14, x + 14, y + 14], outline=(20, 60, 200, 255), width=3)
+            d.text((x - 6, y - 10), 'C', font=font, fill=(20, 60, 200, 255))
+            d.rounded_rectangle((x - 30, y + 18, x + 30, y + 38), radius=4, fill=(255, 255, 255, 230))
+            d.text((x - 26, y + 20), 'SAMPLE', font=font, fill=(220, 30, 30, 255))
+        return draw_cell
+
+    def test_separate_cells_are_all_stamped(self):
+        cell = self.label_cell(load_font(14))
+        cells = [(x, y) for x in range(40, 360, 80) for y in range(30, 240, 80)]
+        self.assertEqual(self.check(lambda d: None, cell, cells), 0)
+
+    def test_solid_pixels_may_cover_earlier_marks(self):
+        def grid(d):
+            # Through the middle of every label row, and through the clear gap above it
+            for y in range(30, 240, 80):
+                d.line([(0, y + 28), (360, y + 28)], fill=(90, 90, 90, 255), width=3)
+                d.line([(0, y + 16), (360, y + 16)], fill=(90, 90, 90, 255), width=1)
+            d.line([(36, 0), (36, 240)], fill=(90, 90, 90, 255), width=3)
+        # Small enough that 'SAMPLE' sits wholly on the label fill, so only the 'C' blends
+        cell = self.label_cell(load_font(10))
+        cells = [(x, y) for x in range(40, 360, 80) for y in range(30, 240, 80)]
+        # The horizontal lines run under the labels' solid fill or the stamps' clear gap and
+        # are stamped over; the vertical one crosses the first column's 'C', whose blended
+        # edges need drawing
+        self.assertEqual(self.check(grid, cell, cells), 3)
+
+    def test_cells_overlapping_blended_pixels_are_drawn(self):
+        font = load_font(22)
+
+        def cell(d, x, y):
+            d.text((x, y), 'WATERMARK', font=font, fill=(220, 30, 30, 160))
+        # Text cells closer than their width: every overlapping cell falls back to drawing
+        cells = [(x, y) for y in range(-10, 240, 18) for x in range(-40, 360, 70)]
+        self.assertGreater(self.check(lambda d: None, cell, cells), 0)
+
+    def test_cells_partly_outside_the_frame(self):
+        cell = self.label_cell(load_font(14))
+        cells = [(x, y) for x in (-20, 350, 370) for y in (-25, 120, 235)]
+        self.check(lambda d: None, cell, cells)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for the fetch layer, driven through a scripted fake transport
+Run with: python -m pytest scripts/test_fetcher.py (or python -m unittest from scripts/)
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from download_cache import DownloadCache
+from fetcher import Fetcher, HTTPStatusError, RetryPolicy, Transport
+
+URL = 'https://images.example/photo'
+
+
+class FakeTransport(Transport):
+    """Answers each request from a script of (status, headers, body chunks) or an exception"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def request(self, url, params, headers, sink):
+        with self._lock:
+            self.calls.append({'url': url, 'headers': dict(headers), 'sink': sink.name})
+            step = self.script.pop(0)
+        if isinstance(step, Exception):
+            sink.write(b'partial')
+            raise step
+        status, response_headers, chunks = step
+        for chunk in chunks:
+            sink.write(chunk)
+        return status, response_headers
+
+
+class RecordingRetry(RetryPolicy):
+    """Real backoff arithmetic, but returns zero delays so the tests never sleep"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.delays = []
+
+    def delay(self, attempt, headers=None):
+        self.delays.append((attempt, super().delay(attempt, headers)))
+        return 0.0
+
+
+class FetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = DownloadCache(root=self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def fetch(self, transport, retry=None):
+        with Fetcher(self.cache, transport=transport, retry=retry) as fetcher:
+            return fetcher.get(URL)
+
+    def leftovers(self):
+        return [name for _, _, names in os.walk(self.root) for name in names if '.tmp' in name]
+
+    def test_retries_transient_failures_with_backoff(self):
+        transport = FakeTransport([
+            (503, {}, []),
+            ConnectionError('reset'),
+            (429, {'Retry-After': '3'}, []),
+            (200, {}, [b'body']),
+        ])
+        retry = RecordingRetry(attempts=4, base=0.5, cap=10.0)
+        self.assertEqual(self.fetch(transport, retry), b'body')
+        self.assertEqual(len(transport.calls), 4)
+        self.assertEqual([attempt for attempt, _ in retry.delays], [0, 1, 2])
+        # Jittered exponential backoff stays within base·2^n, and Retry-After wins over it
+        self.assertLessEqual(retry.delays[0][1], 0.5)
+        self.assertLessEqual(retry.delays[1][1], 1.0)
+        self.assertEqual(retry.delays[2][1], 3.0)
+        self.assertEqual(self.leftovers(), [])
+
+    def test_backoff_is_capped(self):
+        retry = RetryPolicy(base=1.0, cap=2.0)
+        self.assertTrue(all(0 <= retry.delay(8) <= 2.0 for _ in range(50)))
+        self.assertEqual(retry.delay(0, {'Retry-After': '120'}), 2.0)
+
+    def test_gives_up_after_last_attempt(self):
+        transport = FakeTransport([(503, {}, [])] * 3)
+        with self.assertRaises(HTTPStatusError) as ctx:
+            self.fetch(transport, RecordingRetry(attempts=3))
+        self.assertEqual(ctx.exception.status, 503)
+        self.assertEqual(len(transport.calls), 3)
+
+    def test_client_errors_are_not_retried(self):
+        transport = FakeTransport([(404, {}, [])])
+        with self.assertRaises(HTTPStatusError):
+            self.fetch(transport, RecordingRetry())
+        self.assertEqual(len(transport.calls), 1)
+
+    def test_revalidates_stale_entry_with_304(self):
+        self.fetch(FakeTransport([(200, {'ETag': '"v1"', 'Last-Modified': 'Mon, 05 Oct 2026 10:00:00 GMT'},
+                                        [b'cached body'])]))
+        _, meta = self.cache.lookup(URL)
+        fetched_at = meta['fetched_at']
+
+        self.cache.max_age = 0
+        transport = FakeTransport([(304, {}, [])])
+        self.assertEqual(self.fetch(transport), b'cached body')
+        self.assertEqual(transport.calls[0]['headers'], {
+            'If-None-Match': '"v1"',
+            'If-Modified-Since': 'Mon, 05 Oct 2026 10:00:00 GMT',
+        })
+        _, meta = self.cache.lookup(URL)
+        self.assertGreaterEqual(meta['fetched_at'], fetched_at)
+        self.assertEqual(self.leftovers(), [])
+
+    def test_fresh_entry_skips_the_network(self):
+        self.fetch(FakeTransport([(200, {}, [b'body'])]))
+        transport = FakeTransport([])
+        self.assertEqual(self.fetch(transport), b'body')
+        self.assertEqual(transport.calls, [])
+
+    def test_streams_body_into_the_cache(self):
+        chunks = [bytes([i]) * 1000 for i in range(5)]
+        transport = FakeTransport([
+            ConnectionError('dropped mid-body'),
+            (200, {'Content-Type': 'image/jpeg'}, chunks),
+        ])
+        self.assertEqual(self.fetch(transport, RecordingRetry()), b''.join(chunks))
+        # Each attempt streams into its own temp file beside the entry, never into memory
+        sinks = [call['sink'] for call in transport.calls]
+        self.assertEqual(len(set(sinks)), 2)
+        for sink in sinks:
+            self.assertTrue(sink.startswith(self.root))
+            self.assertFalse(os.path.exists(sink))
+        # The partial body from the dropped attempt never reaches the entry
+        data, meta = self.cache.lookup(URL)
+        self.assertEqual(data, b''.join(chunks))
+        self.assertEqual(meta['size'], 5000)
+        self.assertEqual(meta['content_type'], 'image/jpeg')
+        self.assertEqual(self.leftovers(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
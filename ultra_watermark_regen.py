@@ -5,18 +5,39 @@ Ultra watermark regeneration for Landing Page
 - Creates AFTER (clean) images in required sizes
 - Creates BEFORE (full-image, obvious watermark) per type
 - Saves into public/demo/generated with the exact filenames used by the site
+- Adds narrower srcset widths next to each file, listed in srcset.json
 """
 
+import argparse
+import inspect
 import io
+import json
+import multiprocessing
 import os
-import time
-import requests
-from typing import Tuple
-from PIL import Image, ImageDraw, ImageFont, ImageEnhance
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+from PIL import Image, ImageEnhance, ImageFont
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from build_manifest import BuildManifest, digest, file_digest  # noqa: E402
+import compositing  # noqa: E402
+from download_cache import DownloadCache  # noqa: E402
+from encoders import ENCODERS, encode, get_encoder  # noqa: E402
+from fetcher import Fetcher, SessionTransport  # noqa: E402
+from font_registry import FontRegistry  # noqa: E402
+import large_image  # noqa: E402
+import stage_profiler  # noqa: E402
+from stage_profiler import PROFILER  # noqa: E402
+
+# Bump when a change to this script should rebuild every output
+BUILD_VERSION = "1"
 OUTPUT_DIR = "public/demo/generated"
 HERO_SIZE = (1200, 600)
 SHOWCASE_SIZE = (1200, 675)
+# srcset widths; rungs at or above an asset's own width are covered by the full-size file
+LADDER_WIDTHS = (480, 768, 1200, 1920)
+SRCSET_MANIFEST = os.path.join(OUTPUT_DIR, "srcset.json")
 
 THEME_COLORS = {
     "primary": (34, 139, 34),
@@ -71,54 +92,171 @@ IMAGES = {
 }
 
 
+FONT_CANDIDATES = [
+    "/System/Library/Fonts/Helvetica.ttc",
+    "/System/Library/Fonts/Arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+]
+FONTS = FontRegistry(FONT_CANDIDATES)
+# Formats, srcset widths and the optional quality search applied to every output
+DEFAULT_OUTPUT_OPTIONS = {"formats": ("webp",), "widths": LADDER_WIDTHS, "target_ssim": None, "max_bytes": None}
+# Mild enhance applied to every fitted image, as ImageEnhance.Sharpness / ImageEnhance.Color factors
+SHARPNESS = 1.05
+SATURATION = 1.04
+
+
 def get_font(size: int) -> ImageFont.FreeTypeFont:
-    candidates = [
-        "/System/Library/Fonts/Helvetica.ttc",
-        "/System/Library/Fonts/Arial.ttf",
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-    ]
-    for p in candidates:
-        try:
-            return ImageFont.truetype(p, size)
-        except Exception:
-            continue
-    return ImageFont.load_default()
+    return FONTS.get(size)
+
+
+class ProfiledTransport(SessionTransport):
+    """Pooled transport that times each network request as a profiler "download" stage."""
+
+    def request(self, url, params, headers, sink):
+        with PROFILER.stage("download", asset=ASSET_KEYS.get(url)):
+            return super().request(url, params, headers, sink)
+
+
+CACHE = DownloadCache()
+# Two downloads at a time, starting at most one every 0.5 s
+FETCHER = Fetcher(CACHE, concurrency=2, interval=0.5)
+ASSET_KEYS = {cfg["url"]: key for key, cfg in IMAGES.items()}
+
+
+def fetch(url: str) -> bytes:
+    return FETCHER.get(url)
 
 
 def download_and_fit(url: str, target_size: Tuple[int, int]) -> Image.Image:
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    img = Image.open(io.BytesIO(r.content)).convert("RGB")
-
-    # Crop to aspect ratio
-    tr = target_size[0] / target_size[1]
-    rimg = img.width / img.height
-    if rimg > tr:
-        new_w = int(img.height * tr)
-        left = (img.width - new_w) // 2
-        img = img.crop((left, 0, left + new_w, img.height))
-    else:
-        new_h = int(img.width / tr)
-        top = (img.height - new_h) // 2
-        img = img.crop((0, top, img.width, top + new_h))
-    img = img.resize(target_size, Image.Resampling.LANCZOS)
+    return fit_image(fetch(url), target_size)
+
+
+def fit_image(data: bytes, target_size: Tuple[int, int]) -> Image.Image:
+    # Sources several times the target decode at a reduced scale
+    with PROFILER.stage("decode"):
+        img = Image.open(io.BytesIO(data))
+        img = large_image.decode(img, large_image.cover_size(img.size, target_size))
+
+    # Crop to aspect ratio. resize(box=...) would skip the copy, but its filter
+    # reads past the box edges and changes the border rows
+    with PROFILER.stage("crop_resize"):
+        tr = target_size[0] / target_size[1]
+        rimg = img.width / img.height
+        if rimg > tr:
+            new_w = int(img.height * tr)
+            left = (img.width - new_w) // 2
+            img = img.crop((left, 0, left + new_w, img.height))
+        else:
+            new_h = int(img.width / tr)
+            top = (img.height - new_h) // 2
+            img = img.crop((0, top, img.width, top + new_h))
+        img = img.resize(target_size, Image.Resampling.LANCZOS)
 
     # Mild enhance
-    img = ImageEnhance.Sharpness(img).enhance(1.05)
-    img = ImageEnhance.Color(img).enhance(1.04)
+    with PROFILER.stage("enhance"):
+        img = ImageEnhance.Sharpness(img).enhance(SHARPNESS)
+        img = ImageEnhance.Color(img).enhance(SATURATION)
     return img
 
 
-def save_webp(img: Image.Image, name: str):
+def save_encoded(img: Image.Image, name: str, fmt: str, opts: dict, budget_scale: float = 1.0) -> Tuple[str, dict]:
+    """Encode `img` as `name` in one format; returns the path and its encoding record."""
+    encoder = ENCODERS[fmt]
+    name = os.path.splitext(name)[0] + encoder.ext
+    max_bytes = opts["max_bytes"] and max(1, int(opts["max_bytes"] * budget_scale))
+    with PROFILER.stage("encode", asset=name):
+        result = encode(img, encoder, target_ssim=opts["target_ssim"], max_bytes=max_bytes)
     path = os.path.join(OUTPUT_DIR, name)
-    img.save(path, "WEBP", quality=86, method=6)
+    with open(path, "wb") as f:
+        f.write(result.data)
+    info = {"format": fmt, "quality": result.quality, "bytes": len(result.data)}
+    if result.ssim is not None:
+        info["ssim"] = round(result.ssim, 5)
+    return path, info
+
+
+def ladder(size: Tuple[int, int], widths) -> List[Tuple[int, int]]:
+    """Rung sizes narrower than `size`, widest first, keeping the aspect ratio."""
+    return [(w, max(1, round(w * size[1] / size[0]))) for w in sorted(set(widths), reverse=True)
+            if w < size[0]]
+
+
+def rung_name(name: str, width: int) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}-{width}w{ext}"
+
+
+def output_table(cfg: dict, opts: dict) -> Dict[str, Dict[str, Dict[int, str]]]:
+    """role → format → width → file name, covering the full-size file and every rung."""
+    widths = [cfg["size"][0]] + [w for w, _ in ladder(cfg["size"], opts["widths"])]
+    table = {}
+    for role in ("after", "before"):
+        table[role] = {}
+        for fmt in opts["formats"]:
+            name = os.path.splitext(cfg[role])[0] + ENCODERS[fmt].ext
+            table[role][fmt] = {w: name if w == widths[0] else rung_name(name, w) for w in widths}
+    return table
+
+
+def save_ladder(img: Image.Image, name: str, opts: dict) -> Tuple[int, Dict[str, dict]]:
+    """Save `img` under `name` plus its rungs in every format; each rung is downsampled from the previous one.
+
+    Byte budgets scale with each rung's pixel count. Returns the number of
+    rungs and the encoding record of every file written.
+    """
+    infos = dict(save_encoded(img, name, fmt, opts) for fmt in opts["formats"])
+    area = img.width * img.height
+    rungs = ladder(img.size, opts["widths"])
+    for size in rungs:
+        with PROFILER.stage("downsample"):
+            img = img.resize(size, Image.Resampling.LANCZOS)
+        infos.update(save_encoded(img, rung_name(name, size[0]), fmt, opts, size[0] * size[1] / area)
+                     for fmt in opts["formats"])
+    return len(rungs), infos
+
+
+def write_srcset(manifest: BuildManifest, opts: dict):
+    """asset → role → format → width → public path and encoding, for every output on disk.
+
+    The frontend builds srcset (and <picture> sources per format) from it.
+    """
+    srcset = {}
+    for key, cfg in IMAGES.items():
+        entry = {}
+        for role, formats in output_table(cfg, opts).items():
+            for fmt, names in formats.items():
+                files = {}
+                for width, name in sorted(names.items()):
+                    path = os.path.join(OUTPUT_DIR, name)
+                    if not os.path.exists(path):
+                        continue
+                    info = manifest.entries.get(path, {}).get("info", {})
+                    files[str(width)] = {
+                        "path": "/" + os.path.relpath(path, "public").replace(os.sep, "/"),
+                        "bytes": os.path.getsize(path),
+                        **{k: info[k] for k in ("quality", "ssim") if k in info},
+                    }
+                if files:
+                    entry.setdefault(role, {})[fmt] = files
+        if entry:
+            srcset[key] = entry
+    tmp = SRCSET_MANIFEST + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(srcset, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, SRCSET_MANIFEST)
+
+
+def composite(img: Image.Image, *layers) -> Image.Image:
+    """Blend RGBA layers (or solid RGBA tints) over an image and return RGB."""
+    with PROFILER.stage("composite"):
+        return compositing.composite(img, *layers)
 
 
 # Watermark styles
 
 def wm_text_full(img: Image.Image, text: str) -> Image.Image:
-    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    d = ImageDraw.Draw(overlay)
+    d = overlay = compositing.Overlay(img.size)
     color = THEME_COLORS["red"]
     base = max(min(img.width, img.height) // 6, 48)
     font = get_font(base)
@@ -134,37 +272,42 @@ def wm_text_full(img: Image.Image, text: str) -> Image.Image:
     step = max(min(img.width, img.height) // 20, 40)
     for i in range(-img.height, img.width + img.height, step):
         d.line([(i, 0), (i + img.height, img.height)], fill=(*color, 40), width=3)
-    return Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
+    return composite(img, overlay)
 
 
 def wm_logo_full(img: Image.Image) -> Image.Image:
-    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    d = ImageDraw.Draw(overlay)
+    d = overlay = compositing.Overlay(img.size)
     primary, accent = THEME_COLORS["blue"], THEME_COLORS["red"]
     grid = max(min(img.width, img.height) // 5, 160)
     size = grid // 2
     font_c = get_font(size // 3)
     font_l = get_font(size // 4)
+    label = "WATERMARK"
+    cb = d.textbbox((0, 0), "©", font=font_c)
+    lb = d.textbbox((0, 0), label, font=font_l)
+    lw = lb[2] - lb[0]
+
+    def draw_cell(d, gx, gy):
+        x1, y1 = gx - size // 2, gy - size // 2
+        x2, y2 = x1 + size, y1 + size
+        d.ellipse([x1, y1, x2, y2], fill=(255, 255, 255, 230))
+        d.ellipse([x1, y1, x2, y2], outline=(*primary, 255), width=6)
+        d.text((gx - (cb[2]-cb[0])//2, gy - (cb[3]-cb[1])//2), "©", font=font_c, fill=(*accent, 255))
+        d.rounded_rectangle((gx - lw//2 - 8, y2 + 6, gx + lw//2 + 8, y2 + 6 + (lb[3]-lb[1]) + 6),
+                            radius=6, fill=(255, 255, 255, 230))
+        d.text((gx - lw//2, y2 + 8), label, font=font_l, fill=(*primary, 255))
+
+    # One stamp for every cell; cells where pasting would differ from drawing are drawn
+    cell = overlay.make_stamp(draw_cell)
     for gy in range(grid // 2, img.height, grid):
         for gx in range(grid // 2, img.width, grid):
-            x1, y1 = gx - size // 2, gy - size // 2
-            x2, y2 = x1 + size, y1 + size
-            d.ellipse([x1, y1, x2, y2], fill=(255, 255, 255, 230))
-            d.ellipse([x1, y1, x2, y2], outline=(*primary, 255), width=6)
-            cb = d.textbbox((0, 0), "©", font=font_c)
-            d.text((gx - (cb[2]-cb[0])//2, gy - (cb[3]-cb[1])//2), "©", font=font_c, fill=(*accent, 255))
-            label = "WATERMARK"
-            lb = d.textbbox((0, 0), label, font=font_l)
-            lw = lb[2] - lb[0]
-            d.rounded_rectangle((gx - lw//2 - 8, y2 + 6, gx + lw//2 + 8, y2 + 6 + (lb[3]-lb[1]) + 6),
-                                radius=6, fill=(255, 255, 255, 230))
-            d.text((gx - lw//2, y2 + 8), label, font=font_l, fill=(*primary, 255))
-    return Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
+            if not overlay.stamp(cell, (gx, gy)):
+                draw_cell(d, gx, gy)
+    return composite(img, overlay)
 
 
 def wm_pattern_full(img: Image.Image) -> Image.Image:
-    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    d = ImageDraw.Draw(overlay)
+    d = overlay = compositing.Overlay(img.size)
     primary, red = THEME_COLORS["primary"], THEME_COLORS["red"]
     spacing = max(min(img.width, img.height) // 10, 80)
     # grid
@@ -176,67 +319,242 @@ def wm_pattern_full(img: Image.Image) -> Image.Image:
     r = spacing // 5
     font_c = get_font(spacing // 4)
     font_l = get_font(spacing // 5)
+    label = "SAMPLE"
+    cb = d.textbbox((0, 0), "C", font=font_c)
+    lb = d.textbbox((0, 0), label, font=font_l)
+    lw, lh = lb[2] - lb[0], lb[3] - lb[1]
+
+    def draw_cell(d, x, y):
+        d.ellipse([x - r, y - r, x + r, y + r], outline=(*primary, 255), width=3)
+        d.text((x - (cb[2]-cb[0])//2, y - (cb[3]-cb[1])//2), "C", font=font_c, fill=(*primary, 255))
+        d.rounded_rectangle((x - lw//2 - 6, y + r + 6, x + lw//2 + 6, y + r + 6 + lh + 6),
+                            radius=4, fill=(255, 255, 255, 230))
+        d.text((x - lw//2, y + r + 8), label, font=font_l, fill=(*red, 255))
+
+    # One stamp for every cell; cells where pasting would differ from drawing are drawn
+    cell = overlay.make_stamp(draw_cell)
     for x in range(spacing // 2, img.width, spacing):
         for y in range(spacing // 2, img.height, spacing):
-            d.ellipse([x - r, y - r, x + r, y + r], outline=(*primary, 255), width=3)
-            cb = d.textbbox((0, 0), "C", font=font_c)
-            d.text((x - (cb[2]-cb[0])//2, y - (cb[3]-cb[1])//2), "C", font=font_c, fill=(*primary, 255))
-            label = "SAMPLE"
-            lb = d.textbbox((0, 0), label, font=font_l)
-            lw, lh = lb[2] - lb[0], lb[3] - lb[1]
-            d.rounded_rectangle((x - lw//2 - 6, y + r + 6, x + lw//2 + 6, y + r + 6 + lh + 6),
-                                radius=4, fill=(255, 255, 255, 230))
-            d.text((x - lw//2, y + r + 8), label, font=font_l, fill=(*red, 255))
-    return Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
+            if not overlay.stamp(cell, (x, y)):
+                draw_cell(d, x, y)
+    return composite(img, overlay)
 
 
 def wm_embedded_full(img: Image.Image) -> Image.Image:
-    tint = Image.new("RGBA", img.size, (*THEME_COLORS["blue"], 60))
-    base = Image.alpha_composite(img.convert("RGBA"), tint)
-    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    d = ImageDraw.Draw(overlay)
+    d = overlay = compositing.Overlay(img.size)
     font = get_font(max(min(img.width, img.height) // 12, 36))
     step_x = max(img.width // 6, 180)
     step_y = max(img.height // 6, 140)
     for y in range(-step_y, img.height + step_y, step_y):
         for x in range(-step_x, img.width + step_x, step_x):
             d.text((x, y), "PROTECTED", font=font, fill=(*THEME_COLORS["red"], 160))
-    return Image.alpha_composite(base, overlay).convert("RGB")
+    return composite(img, (*THEME_COLORS["blue"], 60), overlay)
 
 
 STYLE_FN = {
     "text": wm_text_full,
-    "logo": lambda im: wm_logo_full(im),
-    "pattern": lambda im: wm_pattern_full(im),
-    "embedded": lambda im: wm_embedded_full(im),
+    "logo": wm_logo_full,
+    "pattern": wm_pattern_full,
+    "embedded": wm_embedded_full,
 }
 
 
-def main():
+def apply_style(img: Image.Image, style_cfg: dict) -> Image.Image:
+    style = style_cfg["type"]
+    fn = STYLE_FN[style]
+    # Self time is the overlay drawing; compositing is its own nested stage
+    with PROFILER.stage("overlay"):
+        if style == "text":
+            return fn(img, style_cfg["text"])  # type: ignore
+        return fn(img)
+
+
+def build_inputs(cfg: dict, data: bytes, opts: dict = DEFAULT_OUTPUT_OPTIONS) -> Tuple[str, str]:
+    """Input digests for an entry's AFTER and BEFORE outputs"""
+    encoders = {fmt: ENCODERS[fmt].save_params() for fmt in opts["formats"]}
+    after = digest(BUILD_VERSION, data, cfg["size"], encoders, opts["target_ssim"], opts["max_bytes"],
+                   inspect.getsource(fit_image), inspect.getsource(large_image.decode), SHARPNESS,
+                   SATURATION, ladder(cfg["size"], opts["widths"]),
+                   inspect.getsource(save_ladder), inspect.getsource(encode))
+    fn = STYLE_FN[cfg["style"]["type"]]
+    before = digest(after, cfg["style"], THEME_COLORS, file_digest(FONTS.path), inspect.getsource(fn))
+    return after, before
+
+
+def render_entry(cfg: dict, data: bytes, build_after: bool = True, build_before: bool = True,
+                 opts: dict = DEFAULT_OUTPUT_OPTIONS) -> Tuple[List[str], Dict[str, dict]]:
+    """Fit, watermark and encode one IMAGES entry with its srcset rungs.
+
+    Returns the progress lines and the encoding record of every file written.
+    """
+    img = fit_image(data, cfg["size"])
+    lines, infos = [], {}
+    # AFTER (clean)
+    if build_after:
+        rungs, written = save_ladder(img, cfg["after"], opts)
+        infos.update(written)
+        lines.append(f"  ✓ saved AFTER: {cfg['after']} (+{rungs} srcset widths){describe(written, cfg['after'])}")
+    else:
+        lines.append(f"  • AFTER up to date: {cfg['after']}")
+    # BEFORE (full watermark), downsampled as a whole so the mark scales with the photo
+    if build_before:
+        rungs, written = save_ladder(apply_style(img, cfg["style"]), cfg["before"], opts)
+        infos.update(written)
+        lines.append(f"  ✓ saved BEFORE: {cfg['before']} (+{rungs} srcset widths){describe(written, cfg['before'])}")
+    else:
+        lines.append(f"  • BEFORE up to date: {cfg['before']}")
+    return lines, infos
+
+
+def describe(infos: Dict[str, dict], name: str) -> str:
+    """Quality and size of the full-size file in each format, for the progress line."""
+    stem = os.path.join(OUTPUT_DIR, os.path.splitext(name)[0])
+    parts = [f"{info['format']} q{info['quality']} {info['bytes'] / 1024:.0f} KB"
+             + (f" ssim {info['ssim']:.4f}" if "ssim" in info else "")
+             for path, info in infos.items() if os.path.splitext(path)[0] == stem and info["quality"]]
+    return f" — {', '.join(parts)}" if parts else ""
+
+
+def init_worker(profile_options: Optional[dict]):
+    """Pool initializer; module-level so forkserver workers can unpickle it."""
+    PROFILER.init_worker(profile_options)
+
+
+def render_profiled(key: str, cfg: dict, data: bytes, flags: Tuple[bool, bool], opts: dict):
+    """render_entry in a worker process; ships the worker's stage timings back with the result."""
+    with PROFILER.stage("render", asset=key):
+        result = render_entry(cfg, data, *flags, opts=opts)
+    return result, PROFILER.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenerate the landing page demo assets")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for fit/watermark/encode work (default: 1, runs in-process)")
+    parser.add_argument("--download-workers", type=int, default=FETCHER.concurrency,
+                        help=f"concurrent downloads (default: {FETCHER.concurrency})")
+    parser.add_argument("--rate-limit", type=float, default=FETCHER.interval,
+                        help=f"minimum seconds between network requests (default: {FETCHER.interval})")
+    parser.add_argument("--cache-dir", default=CACHE.root,
+                        help=f"download cache directory (default: {CACHE.root})")
+    parser.add_argument("--offline", action="store_true",
+                        help="serve sources from the download cache only")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild every output even if its inputs are unchanged")
+    parser.add_argument("--widths", type=parse_widths, default=LADDER_WIDTHS,
+                        help="comma-separated srcset widths, or '' for none (default: 480,768,1200,1920)")
+    parser.add_argument("--formats", type=parse_formats, default=DEFAULT_OUTPUT_OPTIONS["formats"],
+                        help=f"comma-separated output formats from {', '.join(ENCODERS)} (default: webp)")
+    parser.add_argument("--target-ssim", type=float,
+                        help="search each file's quality for the smallest one reaching this SSIM (e.g. 0.95)")
+    parser.add_argument("--max-bytes", type=int,
+                        help="search each full-size file's quality to fit this many bytes; rungs scale it by area")
+    stage_profiler.add_arguments(parser)
+    args = parser.parse_args(argv)
+    opts = {"formats": args.formats, "widths": args.widths,
+            "target_ssim": args.target_ssim, "max_bytes": args.max_bytes}
+    stage_profiler.configure(args)
+    FETCHER.concurrency = max(1, args.download_workers)
+    FETCHER.interval = args.rate_limit
+    FETCHER.transport = ProfiledTransport(FETCHER.concurrency)
+    CACHE.root = args.cache_dir
+    CACHE.offline = CACHE.offline or args.offline
+
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     print("Ultra regeneration started…")
-    for key, cfg in IMAGES.items():
-        print(f"\n→ {key}: downloading & preparing…")
-        try:
-            img = download_and_fit(cfg["url"], cfg["size"])
-        except Exception as e:
-            print(f"  ✖ download failed: {e}")
-            continue
-        # AFTER (clean)
-        save_webp(img, cfg["after"])
-        print(f"  ✓ saved AFTER: {cfg['after']}")
-        # BEFORE (full watermark)
-        style = cfg["style"]["type"]
-        fn = STYLE_FN[style]
-        if style == "text":
-            wm = fn(img, cfg["style"]["text"])  # type: ignore
-        else:
-            wm = fn(img)
-        save_webp(wm, cfg["before"])
-        print(f"  ✓ saved BEFORE: {cfg['before']}")
-        time.sleep(0.5)
+    manifest = BuildManifest(force=args.force)
+    pool = None
+    if args.workers > 1:
+        # Workers start lazily once the fetcher threads are running; forking then could copy
+        # a lock a fetch thread holds, so they come from a fork server instead
+        pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("forkserver"),
+                                   initializer=init_worker, initargs=(PROFILER.options(),))
+    try:
+        with FETCHER:
+            # Queue every download up front; the fetcher runs --download-workers at a time
+            # and each entry renders as soon as its source lands
+            downloads = {FETCHER.submit(cfg["url"]): key for key, cfg in IMAGES.items()}
+            renders = {}
+            for fut in as_completed(downloads):
+                key = downloads[fut]
+                try:
+                    data = fut.result()
+                except Exception as e:
+                    print(f"\n→ {key}: downloading & preparing…")
+                    print(f"  ✖ download failed: {e}")
+                    continue
+                cfg = IMAGES[key]
+                inputs = dict(zip(("after", "before"), build_inputs(cfg, data, opts)))
+                # A role is rebuilt as a whole when any of its files (format × width) is stale
+                stale, flags = {}, []
+                for role, formats in output_table(cfg, opts).items():
+                    paths = [os.path.join(OUTPUT_DIR, n) for names in formats.values() for n in names.values()]
+                    rebuild = not all(manifest.is_fresh(p, inputs[role]) for p in paths)
+                    if rebuild:
+                        stale.update((p, inputs[role]) for p in paths)
+                    flags.append(rebuild)
+                if not stale:
+                    print(f"\n→ {key}: up to date")
+                    continue
+                if pool is None:
+                    with PROFILER.stage("render", asset=key):
+                        infos = report(key, lambda: render_entry(cfg, data, *flags, opts=opts))
+                    if infos is not None:
+                        record(manifest, stale, infos)
+                else:
+                    renders[pool.submit(render_profiled, key, cfg, data, tuple(flags), opts)] = (key, stale)
+            for fut in as_completed(renders):
+                key, stale = renders[fut]
+                infos = report(key, lambda: merge_profile(*fut.result()))
+                if infos is not None:
+                    record(manifest, stale, infos)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        manifest.save()
+        write_srcset(manifest, opts)
+    if FONTS.path is None:
+        print("\n⚠ Rendered with Pillow's default font; glyph metrics differ from hosts with the candidate fonts")
     print("\nAll landing assets regenerated.")
+    stage_profiler.report(args)
+
+
+def parse_widths(value: str) -> Tuple[int, ...]:
+    return tuple(int(w) for w in value.split(",") if w.strip())
+
+
+def parse_formats(value: str) -> Tuple[str, ...]:
+    formats = tuple(f.strip().lower() for f in value.split(",") if f.strip())
+    try:
+        for fmt in formats:
+            get_encoder(fmt)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return formats
+
+
+def report(key: str, result) -> Optional[Dict[str, dict]]:
+    """Print an entry's progress lines; returns its encoding records, or None if it failed."""
+    print(f"\n→ {key}: downloading & preparing…")
+    try:
+        lines, infos = result()
+    except Exception as e:
+        print(f"  ✖ failed: {e}")
+        return None
+    for line in lines:
+        print(line)
+    return infos
+
+
+def merge_profile(result, profile: dict):
+    PROFILER.merge(profile)
+    return result
+
+
+def record(manifest: BuildManifest, outputs: dict, infos: Dict[str, dict]):
+    for output, inputs in outputs.items():
+        manifest.record(output, inputs, info=infos.get(output))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()